@@ -0,0 +1,149 @@
+"""Search latency on a 100k-document corpus.
+
+Seeds ``--docs`` projects, drawings and materials (split evenly) into a
+scratch database, creates the search indexes and times ``search.search``
+for an admin-wide query, an engineer-scoped query and the deepest page
+allowed by ``MAX_SEARCH_WINDOW``. The corpus is kept between runs and only
+re-seeded when its size changes. The exit status is 1 when a case's p95 is
+above ``--target-ms``.
+
+Needs ``MONGO_URL`` pointing at a reachable database; the data goes to
+``--db`` (default ``search_bench``), never to ``DB_NAME``.
+
+Usage::
+
+    cd backend
+    python benchmarks/bench_search.py [--docs 100000] [--repeat 50] [--target-ms 200]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from search import MAX_SEARCH_WINDOW, SEARCH_TARGETS, ensure_search_indexes, search  # noqa: E402
+
+WORDS = (
+    "tower", "villa", "plaza", "bridge", "school", "hospital", "warehouse", "mall",
+    "north", "south", "east", "west", "phase", "block", "wing", "annex",
+    "cement", "steel", "sand", "brick", "tiles", "glass", "timber", "conduit",
+)
+CITIES = ("Pune", "Mumbai", "Chennai", "Hyderabad", "Bengaluru", "Kochi", "Jaipur", "Nagpur")
+ENGINEERS = [f"engineer-{i}" for i in range(50)]
+BATCH = 5000
+
+
+def phrase(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).title()
+
+
+def make_documents(collection: str, count: int, rng: random.Random) -> List[dict]:
+    documents = []
+    for i in range(count):
+        project_id = f"project-{i % 2000}"
+        if collection == "projects":
+            documents.append({
+                "project_id": f"project-{i}",
+                "name": phrase(rng, 3),
+                "location": rng.choice(CITIES),
+                "created_by_admin": "admin-1",
+            })
+        elif collection == "drawings":
+            documents.append({
+                "drawing_id": f"drawing-{i}",
+                "project_id": project_id,
+                "engineer_id": rng.choice(ENGINEERS),
+                "filename": f"{phrase(rng, 2).replace(' ', '_')}_{i}.pdf",
+                "status": rng.choice(("Pending", "Approved", "Rejected")),
+            })
+        else:
+            documents.append({
+                "material_id": f"material-{i}",
+                "project_id": project_id,
+                "engineer_id": rng.choice(ENGINEERS),
+                "name": phrase(rng, 2),
+                "status": rng.choice(("Pending", "Approved", "Rejected")),
+            })
+    return documents
+
+
+async def seed(db, docs: int):
+    per_collection = docs // len(SEARCH_TARGETS)
+    rng = random.Random(42)
+    for collection in SEARCH_TARGETS:
+        if await db[collection].count_documents({}) == per_collection:
+            continue
+        await db[collection].drop()
+        documents = make_documents(collection, per_collection, rng)
+        for start in range(0, len(documents), BATCH):
+            await db[collection].insert_many(documents[start:start + BATCH], ordered=False)
+        print(f"seeded {per_collection} {collection}")
+    await ensure_search_indexes(db)
+
+
+async def timed(fn, repeat: int) -> List[float]:
+    await fn()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def main_async(args) -> int:
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[args.db]
+    try:
+        await seed(db, args.docs)
+
+        everything = {collection: {} for collection in SEARCH_TARGETS}
+        engineer = {"projects": {"assigned_engineers": ENGINEERS[0]},
+                    "drawings": {"engineer_id": ENGINEERS[0]},
+                    "materials": {"engineer_id": ENGINEERS[0]}}
+        last_page = MAX_SEARCH_WINDOW // args.limit
+        cases = [
+            ("admin, page 1", lambda: search(db, args.query, everything, 1, args.limit)),
+            ("engineer, page 1", lambda: search(db, args.query, engineer, 1, args.limit)),
+            (f"admin, page {last_page}", lambda: search(db, args.query, everything, last_page, args.limit)),
+        ]
+
+        status = 0
+        print(f"{'case':<22}{'p50 ms':>10}{'p95 ms':>10}{'total':>10}")
+        for label, fn in cases:
+            latencies = await timed(fn, args.repeat)
+            total = (await fn())["total"]
+            p50 = statistics.median(latencies)
+            p95 = statistics.quantiles(latencies, n=100, method="inclusive")[94]
+            flag = "  over target" if p95 > args.target_ms else ""
+            print(f"{label:<22}{p50:>10.1f}{p95:>10.1f}{total:>10}{flag}")
+            if flag:
+                status = 1
+        return status
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--db", default="search_bench")
+    parser.add_argument("--query", default="tower steel")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--target-ms", type=float, default=200)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Serialization cost of list endpoints, per 1000 rows.
+
+Compares the old path (validate every document against ``List[Material]``,
+run ``jsonable_encoder`` and the stdlib JSON encoder, as FastAPI does for a
+``response_model``) with the trusted path (projected documents dumped
+straight through orjson), for the full and the summary view.
+
+Usage::
+
+    cd backend
+    python benchmarks/bench_serialization.py [--rows 1000] [--repeat 50]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import orjson  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from server import Material, SUMMARY_EXCLUDE  # noqa: E402
+
+
+def make_rows(count: int) -> List[dict]:
+    return [
+        {
+            "material_id": f"{i:024x}",
+            "project_id": f"{i % 40:024x}",
+            "engineer_id": f"{i % 25:024x}",
+            "engineer_name": f"Engineer {i % 25}",
+            "name": f"Cement OPC 53 grade batch {i}",
+            "quantity": f"{i % 90 + 10} bags",
+            "required_date": "2026-11-15",
+            "status": "Pending" if i % 3 else "Approved",
+            "admin_comments": "Approved for the east wing pour; deliver before 9am." if i % 3 == 0 else None,
+            "created_at": "2026-10-19T08:30:00.000000+00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def validated_json(adapter, rows):
+    validated = adapter.validate_python(rows)
+    content = jsonable_encoder(validated)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def trusted_json(rows):
+    return orjson.dumps(rows)
+
+
+def timed(fn, repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    summary_rows = [{k: v for k, v in row.items() if k not in SUMMARY_EXCLUDE} for row in rows]
+    adapter = TypeAdapter(List[Material])
+
+    cases = [
+        ("response_model + json", lambda: validated_json(adapter, rows)),
+        ("trusted orjson", lambda: trusted_json(rows)),
+        ("trusted orjson (summary)", lambda: trusted_json(summary_rows)),
+    ]
+
+    per_thousand = 1000 / args.rows
+    baseline = None
+    print(f"{'path':<28}{'ms/1000 rows':>14}{'bytes/1000':>12}{'speedup':>10}")
+    for label, fn in cases:
+        seconds = timed(fn, args.repeat)
+        size = len(fn())
+        baseline = baseline or seconds
+        print(f"{label:<28}{seconds * 1000 * per_thousand:>14.2f}{int(size * per_thousand):>12}{baseline / seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
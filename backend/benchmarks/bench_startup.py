@@ -0,0 +1,105 @@
+"""Startup cost: module import, app construction and first-request latency.
+
+Each phase runs in a fresh interpreter so nothing is cached between runs:
+
+* ``import``   - ``import server`` with no Mongo/Resend configuration at all
+* ``create``   - ``server.create_app()`` on top of the import
+* ``first request`` - spawn ``uvicorn server:app`` and time until the first
+  ``GET /metrics`` answers (includes the lifespan: Mongo connect + indexes,
+  so it needs ``MONGO_URL``/``DB_NAME`` pointing at a reachable database)
+
+Usage::
+
+    cd backend
+    python benchmarks/bench_startup.py [--repeat 5] [--skip-server]
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import server
+print(time.perf_counter() - start)
+"""
+
+CREATE_SNIPPET = """
+import time
+start = time.perf_counter()
+import server
+from settings import Settings
+server.create_app(Settings())
+print(time.perf_counter() - start)
+"""
+
+
+def clean_env() -> dict:
+    env = dict(os.environ)
+    for name in ("MONGO_URL", "DB_NAME", "RESEND_API_KEY"):
+        env.pop(name, None)
+    return env
+
+
+def time_snippet(snippet: str) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", snippet], cwd=BACKEND_DIR, env=clean_env(),
+        check=True, capture_output=True, text=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_first_request(timeout: float = 30.0) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1):
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError("server did not answer within the timeout")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def report(label: str, samples):
+    print(f"{label:<16}median {statistics.median(samples) * 1000:8.1f} ms   "
+          f"min {min(samples) * 1000:8.1f} ms   max {max(samples) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-server", action="store_true", help="skip the first-request phase")
+    args = parser.parse_args()
+
+    report("import", [time_snippet(IMPORT_SNIPPET) for _ in range(args.repeat)])
+    report("create", [time_snippet(CREATE_SNIPPET) for _ in range(args.repeat)])
+    if not args.skip_server:
+        report("first request", [time_first_request() for _ in range(args.repeat)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+"""Replay recorded request traces and compare per-route latency.
+
+Traces are the JSON lines written by ``TraceCaptureMiddleware`` (set
+``TRACE_CAPTURE_FILE`` on the server being recorded). Replaying needs a
+running API on a throwaway database:
+
+* ``--seed`` first creates admins, engineers, clients, projects, phases,
+  drawings, materials and holidays through the API and saves them to
+  ``--fixtures``; later runs reuse that file.
+* Every record is re-issued at its recorded offset (scaled by ``--speed``;
+  ``0`` sends as fast as ``--concurrency`` allows). User and id pseudonyms
+  map consistently onto seeded users of the same role and seeded records, so
+  login bursts, notification polling and dashboard loads keep their mix.
+  Pseudonyms are numbered per capturing worker, so each worker's ``u1`` gets
+  its own seeded user.
+  Write routes get a representative body; routes that need state the replay
+  cannot rebuild (resumable upload sessions) are skipped, and so are deletes,
+  which would remove the seeded fixtures that later records and runs use.
+* Latency is reported per route and saved with ``--output``. With
+  ``--baseline`` the p50/p95 deltas are shown and the exit status is 1 when a
+  route's p95 regresses by more than ``--threshold``.
+
+Run the server with generous ``RATE_LIMITS`` (e.g. ``auth=100000/60``) so
+replayed bursts measure the code rather than the limiter.
+
+Usage::
+
+    cd backend
+    python benchmarks/replay.py traces.jsonl --seed --output baseline.json
+    python benchmarks/replay.py traces.jsonl --baseline baseline.json [--speed 2]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+PASSWORD = "replay-password"
+SEARCH_WORD = "Tower"
+ROLES = ("Admin", "Engineer", "Client")
+
+# Minimal PDF so seeded and replayed uploads pass the content-type check.
+PDF_BYTES = b"%PDF-1.4\n1 0 obj<<>>endobj\ntrailer<<>>\n%%EOF\n"
+
+# Path/query parameter name -> fixture list its pseudonyms map onto.
+ENTITY_PARAMS = {
+    "project_id": "projects",
+    "schedule_id": "schedules",
+    "drawing_id": "drawings",
+    "material_id": "materials",
+    "holiday_id": "holidays",
+    "notification_id": "notifications",
+    "engineer_id": "engineers",
+}
+
+SKIPPED_ROUTES = ("/api/drawings/uploads",)
+# Deleting seeded projects, phases or holidays would break every later run.
+SKIPPED_METHODS = ("DELETE",)
+
+
+def pseudonym_index(value: str) -> int:
+    digits = "".join(ch for ch in value if ch.isdigit())
+    return int(digits) - 1 if digits else 0
+
+
+def pick(items: list, value: str):
+    return items[pseudonym_index(value) % len(items)] if items else None
+
+
+# ====================
+# SEEDING
+# ====================
+
+async def call(client: httpx.AsyncClient, method: str, url: str, token: Optional[str] = None, **kwargs):
+    """Request that waits out 429s, so seeding works under default rate limits."""
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    while True:
+        response = await client.request(method, url, headers=headers, **kwargs)
+        if response.status_code != 429:
+            response.raise_for_status()
+            return response.json()
+        await asyncio.sleep(float(response.headers.get("retry-after", "1")))
+
+
+async def seed(client: httpx.AsyncClient, args) -> dict:
+    run = uuid.uuid4().hex[:6]
+    users = {role: [] for role in ROLES}
+    counts = {"Admin": args.admins, "Engineer": args.engineers, "Client": args.clients}
+    for role, count in counts.items():
+        for i in range(count):
+            email = f"replay-{run}-{role.lower()}{i}@example.com"
+            body = await call(client, "POST", "/api/auth/register", json={
+                "email": email, "password": PASSWORD, "name": f"Replay {role} {i}", "role": role,
+            })
+            users[role].append({"user_id": body["user"]["user_id"], "email": email, "token": body["token"]})
+
+    admins, engineers, clients = users["Admin"], users["Engineer"], users["Client"]
+    today = date.today()
+    fixtures = {"users": users, "engineers": [e["user_id"] for e in engineers],
+                "projects": [], "schedules": [], "drawings": [], "materials": [], "holidays": []}
+
+    for i in range(args.projects):
+        admin = admins[i % len(admins)]
+        project = await call(client, "POST", "/api/projects", admin["token"], json={
+            "name": f"{SEARCH_WORD} {i} {run}",
+            "client_email": clients[i % len(clients)]["email"],
+            "location": f"Site {i}",
+            "start_date": today.isoformat(),
+            "end_date": (today + timedelta(days=365)).isoformat(),
+            "budget": 1_000_000 + i,
+        })
+        project_id = project["project_id"]
+        fixtures["projects"].append(project_id)
+        team = [engineers[(i + k) % len(engineers)] for k in range(min(3, len(engineers)))]
+        await call(client, "POST", f"/api/projects/{project_id}/assign", admin["token"],
+                   json=[e["user_id"] for e in team])
+
+        for phase in range(args.phases):
+            schedule = await call(client, "POST", "/api/schedules", admin["token"], json={
+                "project_id": project_id, "phase_name": f"Phase {phase}",
+                "start_date": today.isoformat(), "duration": 10,
+            })
+            fixtures["schedules"].append(schedule["schedule_id"])
+
+        for engineer in team:
+            material = await call(client, "POST", "/api/materials/request", engineer["token"], json={
+                "project_id": project_id, "name": f"Cement batch {i}",
+                "quantity": "50 bags", "required_date": (today + timedelta(days=30)).isoformat(),
+            })
+            fixtures["materials"].append(material["material_id"])
+            drawing = await call(client, "POST", "/api/drawings/upload", engineer["token"],
+                                 data={"project_id": project_id},
+                                 files={"file": (f"plan-{i}.pdf", PDF_BYTES, "application/pdf")})
+            fixtures["drawings"].append(drawing["drawing_id"])
+
+    for i in range(args.holidays):
+        holiday = await call(client, "POST", "/api/holidays", admins[0]["token"], json={
+            "name": f"Holiday {i}", "date": (today + timedelta(days=40 + i * 7)).isoformat(),
+        })
+        fixtures["holidays"].append(holiday["holiday_id"])
+
+    # Notification ids are per user: marking someone else's as read is a 404.
+    fixtures["notifications"] = {}
+    for user in [u for role in ROLES for u in users[role]]:
+        notifications = await call(client, "GET", "/api/notifications", user["token"])
+        fixtures["notifications"][user["user_id"]] = [n["notification_id"] for n in notifications]
+    return fixtures
+
+
+# ====================
+# REPLAY
+# ====================
+
+class Replayer:
+    def __init__(self, fixtures: dict):
+        self.fixtures = fixtures
+        self.all_users = [u for role in ROLES for u in fixtures["users"][role]]
+        self.logins = 0
+        # (worker, kind, pseudonym) -> fixture index, for traces from several workers
+        self._indexes: Dict[tuple, int] = {}
+        self._next_index: Dict[str, int] = {}
+
+    def pick(self, items: list, kind: str, value: str, record: dict):
+        if "worker" not in record:
+            return pick(items, value)  # single-process trace
+        key = (record["worker"], kind, value)
+        if key not in self._indexes:
+            self._indexes[key] = self._next_index.get(kind, 0)
+            self._next_index[kind] = self._indexes[key] + 1
+        return items[self._indexes[key] % len(items)] if items else None
+
+    def user_for(self, record: dict) -> Optional[dict]:
+        if not record.get("user") or not record.get("role"):
+            return None
+        return self.pick(self.fixtures["users"].get(record["role"], []), record["role"], record["user"], record)
+
+    def entity(self, name: str, value: str, user: Optional[dict], record: dict) -> str:
+        kind = ENTITY_PARAMS.get(name)
+        if kind == "notifications":
+            items = self.fixtures["notifications"].get(user["user_id"], []) if user else []
+        elif kind:
+            items = self.fixtures[kind]
+        else:
+            return value
+        return self.pick(items, kind, value, record) or value
+
+    def body(self, method: str, route: str, path: dict) -> dict:
+        """Request body keyword arguments for write routes."""
+        today = date.today()
+        engineers = self.fixtures["engineers"]
+        clients = self.fixtures["users"]["Client"]
+        project_id = path.get("project_id") or self.fixtures["projects"][0]
+        key = f"{method} {route}"
+
+        if key == "POST /api/auth/login":
+            self.logins += 1
+            login = self.all_users[self.logins % len(self.all_users)]
+            role = next(r for r in ROLES if login in self.fixtures["users"][r])
+            return {"json": {"email": login["email"], "password": PASSWORD, "role": role}}
+        if key == "POST /api/auth/register":
+            return {"json": {"email": f"replay-{uuid.uuid4().hex[:10]}@example.com", "password": PASSWORD,
+                             "name": "Replay signup", "role": "Engineer"}}
+        bodies = {
+            "POST /api/projects": {"json": {
+                "name": f"{SEARCH_WORD} replay", "client_email": clients[0]["email"], "location": "Replay",
+                "start_date": today.isoformat(), "end_date": (today + timedelta(days=365)).isoformat(),
+                "budget": 500000,
+            }},
+            "PUT /api/projects/{project_id}": {"json": {"status": "In Progress"}},
+            "POST /api/projects/{project_id}/assign": {"json": engineers[:3]},
+            "POST /api/projects/{project_id}/progress": {"json": {"project_id": project_id, "progress": 40}},
+            "POST /api/teams": {"json": {"name": "Replay team", "project_id": project_id, "engineer_ids": engineers[:3]}},
+            "POST /api/drawings/upload": {
+                "data": {"project_id": project_id},
+                "files": {"file": ("replay.pdf", PDF_BYTES, "application/pdf")},
+            },
+            "POST /api/drawings/{drawing_id}/approve": {"json": {"status": "Approved", "comments": None}},
+            "POST /api/materials/request": {"json": {
+                "project_id": project_id, "name": "Replay steel", "quantity": "2 t",
+                "required_date": (today + timedelta(days=20)).isoformat(),
+            }},
+            "POST /api/materials/{material_id}/approve": {"json": {"status": "Approved", "comments": None}},
+            "POST /api/holidays": {"json": {"name": "Replay holiday", "date": (today + timedelta(days=90)).isoformat()}},
+            "POST /api/schedules": {"json": {
+                "project_id": project_id, "phase_name": "Replay phase",
+                "start_date": today.isoformat(), "duration": 5,
+            }},
+            "PUT /api/schedules/{schedule_id}": {"json": {"description": "Replayed edit"}},
+        }
+        return bodies.get(key, {})
+
+    def build(self, record: dict) -> Optional[dict]:
+        route, method = record["route"], record["method"]
+        if route == "unmatched" or route.startswith(SKIPPED_ROUTES) or method in SKIPPED_METHODS:
+            return None
+        user = self.user_for(record)
+        path = {name: self.entity(name, value, user, record) for name, value in record.get("path", {}).items()}
+        url = route.format(**path)
+
+        params = {}
+        for name, value in record.get("query", {}).items():
+            if isinstance(value, int):
+                params[name] = SEARCH_WORD if name == "q" else "x" * value
+            else:
+                params[name] = self.entity(name, value, user, record)
+
+        kwargs = self.body(method, route, path)
+        if record.get("body_bytes") and not kwargs:
+            return None  # a write route this tool has no body for
+        headers = {"Authorization": f"Bearer {user['token']}"} if user else {}
+        return {"method": method, "url": url, "params": params, "headers": headers, **kwargs}
+
+
+async def replay(client: httpx.AsyncClient, records: List[dict], replayer: Replayer, speed: float, concurrency: int):
+    results: Dict[str, dict] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+
+    def bucket(record):
+        name = f"{record['method']} {record['route']}"
+        return results.setdefault(name, {"latencies": [], "errors": 0, "client_errors": 0,
+                                         "skipped": 0, "recorded": []})
+
+    async def issue(record, request):
+        stats = bucket(record)
+        stats["recorded"].append(record["duration_ms"])
+        if request is None:
+            stats["skipped"] += 1
+            return
+        if speed > 0:
+            delay = record["t"] / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        async with semaphore:
+            sent = time.perf_counter()
+            try:
+                response = await client.request(**request)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 599
+            stats["latencies"].append((time.perf_counter() - sent) * 1000)
+        if status >= 500:
+            stats["errors"] += 1
+        elif status >= 400:
+            stats["client_errors"] += 1
+
+    first = records[0]["t"] if records else 0
+    for record in records:
+        record["t"] -= first
+    await asyncio.gather(*[issue(record, replayer.build(record)) for record in records])
+    return results
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def summarize(results: Dict[str, dict]) -> Dict[str, dict]:
+    return {
+        route: {
+            "count": len(stats["latencies"]),
+            "p50_ms": percentile(stats["latencies"], 50),
+            "p95_ms": percentile(stats["latencies"], 95),
+            "errors": stats["errors"],
+            "client_errors": stats["client_errors"],
+            "skipped": stats["skipped"],
+            "recorded_p50_ms": percentile(stats["recorded"], 50),
+        }
+        for route, stats in sorted(results.items())
+    }
+
+
+def delta(current: Optional[float], base: Optional[float]) -> Optional[float]:
+    if current is None or not base:
+        return None
+    return (current - base) / base
+
+
+def report(summary: Dict[str, dict], baseline: Optional[Dict[str, dict]], threshold: float, min_count: int) -> int:
+    def ms(value):
+        return f"{value:9.1f}" if value is not None else f"{'-':>9}"
+
+    def pct(value):
+        return f"{value * 100:+8.1f}%" if value is not None else f"{'-':>9}"
+
+    header = f"{'route':<56}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'5xx':>5}{'4xx':>5}{'skip':>5}"
+    header += f"{'Δp50':>10}{'Δp95':>10}" if baseline else f"{'prod p50':>9}"
+    print(header)
+    regressions = 0
+    for route, row in summary.items():
+        line = (f"{route[:55]:<56}{row['count']:>6}{ms(row['p50_ms'])}{ms(row['p95_ms'])}"
+                f"{row['errors']:>5}{row['client_errors']:>5}{row['skipped']:>5}")
+        if baseline:
+            base = baseline.get(route, {})
+            p95_delta = delta(row["p95_ms"], base.get("p95_ms"))
+            line += f"{pct(delta(row['p50_ms'], base.get('p50_ms')))}{pct(p95_delta)}"
+            if p95_delta is not None and p95_delta > threshold and row["count"] >= min_count:
+                regressions += 1
+                line += "  REGRESSION"
+        else:
+            line += ms(row["recorded_p50_ms"])
+        print(line)
+    if baseline:
+        print(f"\n{regressions} route(s) regressed by more than {threshold:.0%} at p95")
+    return regressions
+
+
+async def main_async(args) -> int:
+    records = [json.loads(line) for line in Path(args.trace).read_text().splitlines() if line.strip()]
+    records.sort(key=lambda record: record["t"])
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        fixtures_path = Path(args.fixtures)
+        if args.seed or not fixtures_path.exists():
+            fixtures = await seed(client, args)
+            fixtures_path.write_text(json.dumps(fixtures, indent=2))
+        else:
+            fixtures = json.loads(fixtures_path.read_text())
+
+        results = await replay(client, records, Replayer(fixtures), args.speed, args.concurrency)
+
+    summary = summarize(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(summary, indent=2))
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    return 1 if report(summary, baseline, args.threshold, args.min_count) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace", help="JSON lines written by TRACE_CAPTURE_FILE")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8001")
+    parser.add_argument("--fixtures", default="replay_fixtures.json")
+    parser.add_argument("--seed", action="store_true", help="seed a fresh data set even if --fixtures exists")
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--engineers", type=int, default=10)
+    parser.add_argument("--clients", type=int, default=5)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--phases", type=int, default=4)
+    parser.add_argument("--holidays", type=int, default=5)
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression; 0 replays back to back")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="write the per-route summary as JSON")
+    parser.add_argument("--baseline", help="summary JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p95 regression that fails the run")
+    parser.add_argument("--min-count", type=int, default=5, help="ignore routes replayed fewer times")
+    sys.exit(asyncio.run(main_async(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Small in-process TTL cache for per-user read models."""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+# Invalidating this key clears the whole cache.
+ALL_KEYS = "*"
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries expire ``ttl`` seconds after being set."""
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        if key == ALL_KEYS:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,181 @@
+"""Response compression negotiated from ``Accept-Encoding``.
+
+The accepted coding with the highest q-value is used; brotli (when the
+optional ``brotli`` package is installed) wins a tie with gzip. Bodies below ``COMPRESSION_MIN_SIZE`` bytes,
+responses that already carry a ``Content-Encoding`` and media that is already
+compressed (JPEG/PNG drawings, PDFs, archives) are passed through untouched.
+
+Bytes in/out and the CPU time spent compressing are recorded per route so the
+ratio and cost show up on ``/metrics``.
+"""
+
+import time
+import zlib
+
+from metrics import registry, route_template
+
+# Media types that are already compressed; recompressing only burns CPU.
+INCOMPRESSIBLE_TYPES = (
+    "image/jpeg", "image/jpg", "image/png", "image/gif", "image/webp",
+    "application/pdf", "application/zip", "application/gzip",
+    "application/octet-stream", "video/", "audio/",
+)
+
+compression_bytes_in_total = registry.counter(
+    "compression_bytes_in_total", "Response bytes before compression by route and encoding.", ("route", "encoding")
+)
+compression_bytes_out_total = registry.counter(
+    "compression_bytes_out_total", "Response bytes after compression by route and encoding.", ("route", "encoding")
+)
+compression_cpu_seconds = registry.histogram(
+    "compression_cpu_seconds", "CPU time spent compressing one response by route and encoding.", ("route", "encoding"),
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+
+
+_brotli = None
+
+
+def brotli_module():
+    """The optional ``brotli`` package, imported on first use; None if missing."""
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli or None
+
+
+def negotiate_encoding(accept_encoding: str):
+    """Pick ``br`` or ``gzip`` from an Accept-Encoding header, or None.
+
+    The acceptable coding with the highest q-value wins; brotli breaks a tie.
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    supported = ["br", "gzip"] if brotli_module() is not None else ["gzip"]
+    # max() keeps the first of equal qualities, so brotli wins a tie.
+    encoding = max(supported, key=lambda coding: accepted.get(coding, wildcard))
+    return encoding if accepted.get(encoding, wildcard) > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        self.cpu_seconds = 0.0
+        if encoding == "br":
+            self._impl = brotli_module().Compressor(quality=brotli_quality)
+        else:
+            self._impl = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        start = time.thread_time()
+        if self.encoding == "br":
+            out = self._impl.process(data) + (self._impl.finish() if final else self._impl.flush())
+        else:
+            out = self._impl.compress(data) + self._impl.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        self.cpu_seconds += time.thread_time() - start
+        return out
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing eligible responses with brotli or gzip."""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate_encoding(accept)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+        bytes_in = bytes_out = 0
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough, bytes_in, bytes_out
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = {k.lower(): v for k, v in start_message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+                if (
+                    b"content-encoding" in headers
+                    or content_type.startswith(INCOMPRESSIBLE_TYPES)
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                raw_headers = [
+                    (k, v) for k, v in start_message.get("headers", [])
+                    if k.lower() not in (b"content-length", b"vary")
+                ]
+                vary = headers.get(b"vary")
+                raw_headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+                raw_headers.append((b"content-encoding", encoding.encode()))
+                if not more_body:
+                    compressed = compressor.compress(body, final=True)
+                    raw_headers.append((b"content-length", str(len(compressed)).encode()))
+                    await send({**start_message, "headers": raw_headers})
+                    bytes_in, bytes_out = len(body), len(compressed)
+                    await send({"type": "http.response.body", "body": compressed})
+                    self._record(scope, encoding, bytes_in, bytes_out, compressor.cpu_seconds)
+                    return
+                await send({**start_message, "headers": raw_headers})
+
+            compressed = compressor.compress(body, final=not more_body)
+            bytes_in += len(body)
+            bytes_out += len(compressed)
+            await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+            if not more_body:
+                self._record(scope, encoding, bytes_in, bytes_out, compressor.cpu_seconds)
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _record(scope, encoding: str, bytes_in: int, bytes_out: int, cpu_seconds: float):
+        route = route_template(scope) or "unmatched"
+        compression_bytes_in_total.inc(route, encoding, amount=bytes_in)
+        compression_bytes_out_total.inc(route, encoding, amount=bytes_out)
+        compression_cpu_seconds.observe(route, encoding, value=cpu_seconds)
@@ -0,0 +1,45 @@
+"""Optimistic concurrency for versioned documents.
+
+Projects and schedules carry a ``version`` that every update increments.
+Reads expose it as an ``ETag``; a write that sends ``If-Match`` with the
+version it read only applies if nobody else has written in between, and
+answers 409 with the current version otherwise. Documents written before
+versioning have no ``version`` field and count as version 0.
+"""
+
+from typing import Optional
+
+from fastapi import HTTPException
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def parse_if_match(value: Optional[str]) -> Optional[int]:
+    """Version from an ``If-Match`` header (``"3"``, ``W/"3"`` or ``3``); None if absent or ``*``."""
+    if value is None:
+        return None
+    value = value.strip()
+    if value == "*":
+        return None
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a version ETag")
+
+
+def version_filter(version: int) -> dict:
+    if version == 0:
+        return {"version": {"$in": [0, None]}}
+    return {"version": version}
+
+
+def conflict(current: Optional[int]):
+    return HTTPException(
+        status_code=409,
+        detail={"message": "Modified by someone else; reload and retry", "version": current or 0},
+        headers={"ETag": etag(current or 0)},
+    )
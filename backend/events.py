@@ -0,0 +1,154 @@
+"""Write-event bus that turns document writes into cache invalidations.
+
+Mutating routes publish a ``WriteEvent`` (collection, operation, document
+key and any related ids the route already has at hand). Caches register
+*rules* per collection: async callables mapping an event to the
+``(channel, key)`` pairs to invalidate. The bus publishes those through the
+``InvalidationBroker``, which applies them locally and forwards them to the
+other workers. ``publish_all`` dispatches several events (a notification
+fan-out) as one broker message.
+
+Writes made outside the app (scripts, the Mongo shell, another service) can
+be picked up with ``watch``, a Mongo change stream (replica sets only). Every
+worker runs its own stream, so its invalidations are applied locally and not
+forwarded. The stream also sees the app's own writes; each published write
+is announced on the ``writes`` channel, and a change to a document announced
+in the last ``PUBLISHED_WRITE_SECONDS`` is skipped. Deletes seen on the
+stream carry no document, so their key is ``None`` and rules invalidate
+broadly; notification deletes (read-TTL expiry, archiving) are ignored.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from invalidation import InvalidationBroker
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Business key of each watched collection.
+ID_FIELDS = {
+    "users": "user_id",
+    "projects": "project_id",
+    "holidays": "holiday_id",
+    "drawings": "drawing_id",
+    "materials": "material_id",
+    "notifications": "notification_id",
+}
+
+# Changes the stream does not dispatch: notifications are only deleted by the
+# read TTL and the archiver, and a keyless delete would flush every dashboard.
+IGNORED_CHANGES = {"notifications": ["delete"]}
+
+# Channel announcing the app's own writes, so change streams can skip them.
+WRITES_CHANNEL = "writes"
+PUBLISHED_WRITE_SECONDS = 10
+MAX_PUBLISHED_WRITES = 10000
+
+write_events_total = registry.counter(
+    "write_events_total", "Write events dispatched by collection and source.", ("collection", "source")
+)
+
+
+class WriteEvent(NamedTuple):
+    collection: str
+    op: str                 # insert / update / delete
+    key: Optional[str]      # business id; None when unknown
+    related: dict = {}      # ids the publisher already has, e.g. engineer_id
+
+
+Rule = Callable[[WriteEvent], Awaitable[Iterable[Tuple[str, Optional[str]]]]]
+
+
+class WriteEventBus:
+    def __init__(self, broker: InvalidationBroker):
+        self.broker = broker
+        self._rules: Dict[str, List[Rule]] = {}
+        # "collection:key" -> monotonic time the write was announced
+        self._published: "OrderedDict[str, float]" = OrderedDict()
+        broker.subscribe(WRITES_CHANNEL, self._remember)
+
+    def subscribe(self, collection: str, rule: Rule):
+        self._rules.setdefault(collection, []).append(rule)
+
+    async def publish(self, collection: str, op: str, key: Optional[str], **related):
+        await self.publish_all([WriteEvent(collection, op, key, related)])
+
+    async def publish_all(self, events: Iterable[WriteEvent]):
+        """Dispatch the app's own writes and forward their invalidations in one message."""
+        invalidations = set()
+        for event in events:
+            invalidations |= await self._invalidations(event, source="app")
+            if event.key is not None:
+                invalidations.add((WRITES_CHANNEL, f"{event.collection}:{event.key}"))
+        await self.broker.publish_all(invalidations)
+
+    async def dispatch(self, event: WriteEvent, source: str):
+        for channel, key in await self._invalidations(event, source):
+            self.broker.apply(channel, key)
+
+    async def _invalidations(self, event: WriteEvent, source: str) -> set:
+        write_events_total.inc(event.collection, source)
+        invalidations = set()
+        for rule in self._rules.get(event.collection, ()):
+            try:
+                invalidations.update(await rule(event))
+            except Exception as e:
+                logger.error(f"Write event rule for {event.collection} failed: {str(e)}")
+        return invalidations
+
+    def _remember(self, write: str):
+        self._published[write] = time.monotonic()
+        self._published.move_to_end(write)
+        while len(self._published) > MAX_PUBLISHED_WRITES:
+            self._published.popitem(last=False)
+
+    def _was_published(self, event: WriteEvent) -> bool:
+        """True once per announced write, if it was announced recently."""
+        announced = self._published.pop(f"{event.collection}:{event.key}", None)
+        return announced is not None and time.monotonic() - announced < PUBLISHED_WRITE_SECONDS
+
+    async def watch(self, db):
+        """Dispatch writes from a change stream on the watched collections until cancelled."""
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(self._rules)},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+            "$nor": [
+                {"ns.coll": collection, "operationType": {"$in": ops}}
+                for collection, ops in IGNORED_CHANGES.items()
+            ],
+        }}]
+        resume_token = None
+        while True:
+            try:
+                async with db.watch(
+                    pipeline, full_document="updateLookup", resume_after=resume_token
+                ) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        event = self._to_event(change)
+                        if event.key is None or not self._was_published(event):
+                            await self.dispatch(event, source="change_stream")
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                # 40573: change streams need a replica set or sharded cluster
+                if e.code == 40573:
+                    logger.warning("Change streams unavailable on a standalone server; not watching")
+                    return
+                logger.error(f"Change stream failed: {str(e)}")
+            except PyMongoError as e:
+                logger.error(f"Change stream failed: {str(e)}")
+            await asyncio.sleep(1)
+
+    @staticmethod
+    def _to_event(change: dict) -> WriteEvent:
+        collection = change["ns"]["coll"]
+        op = {"replace": "update"}.get(change["operationType"], change["operationType"])
+        document = change.get("fullDocument") or {}
+        return WriteEvent(collection, op, document.get(ID_FIELDS.get(collection, "_id")), document)
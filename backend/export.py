@@ -0,0 +1,45 @@
+"""Streaming CSV / NDJSON export straight from a Motor cursor.
+
+Documents are pulled ``EXPORT_BATCH_SIZE`` at a time and encoded as they
+arrive, so memory stays flat no matter how many rows are exported.
+"""
+
+import csv
+import io
+from typing import AsyncIterator, List
+
+import orjson
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _csv_line(values) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue().encode()
+
+
+async def stream_export(cursor, fmt: str, columns: List[str],
+                        batch_size: int = 500) -> AsyncIterator[bytes]:
+    """Yield the cursor's documents encoded as ``fmt``, one chunk per batch."""
+    cursor = cursor.batch_size(batch_size)
+    chunk = []
+    if fmt == "csv":
+        chunk.append(_csv_line(columns))
+
+    async for document in cursor:
+        if fmt == "csv":
+            chunk.append(_csv_line(
+                "" if document.get(column) is None else document.get(column) for column in columns
+            ))
+        else:
+            chunk.append(orjson.dumps({column: document.get(column) for column in columns}) + b"\n")
+        if len(chunk) >= batch_size:
+            yield b"".join(chunk)
+            chunk = []
+
+    if chunk:
+        yield b"".join(chunk)
@@ -0,0 +1,257 @@
+"""``Idempotency-Key`` support for POST routes.
+
+A POST carrying an ``Idempotency-Key`` header claims the key (hashed with the
+caller's identity, method and path) in ``idempotency_keys`` before the route
+runs, then stores the response once it completes. A retry with the same key
+gets the stored response back, marked with ``Idempotent-Replayed: true``,
+without re-running the route, so no duplicate documents, GridFS blobs or
+notification fan-outs. A retry that arrives while the first attempt is still
+running gets a 409. Failed attempts (5xx or an exception) release the key so
+the client can retry for real; a claim still pending after
+``IDEMPOTENCY_LEASE_SECONDS`` belongs to a worker that died mid-request and
+is taken over by the next retry.
+
+The key also stores a fingerprint of the request body, hashed while the body
+is read. Reusing a key with a different body is a client bug and gets a 422
+rather than somebody else's response. The body has to be read before the
+route runs; past ``MAX_BUFFERED_BODY`` it is spooled to a temporary file, so
+a large upload does not sit in memory.
+
+Keys expire ``IDEMPOTENCY_TTL_HOURS`` after first use through a TTL index.
+"""
+
+import hashlib
+import logging
+import tempfile
+from datetime import datetime, timezone, timedelta
+
+from bson import ObjectId
+
+from pymongo.errors import DuplicateKeyError
+
+from indexes import ensure_ttl_index
+
+logger = logging.getLogger(__name__)
+
+# Responses larger than this are not cached; the key is released instead.
+MAX_STORED_RESPONSE = 256 * 1024
+# Request bodies above this are spooled to disk while the key is checked.
+MAX_BUFFERED_BODY = 1024 * 1024
+REPLAY_CHUNK_SIZE = 64 * 1024
+
+# Headers worth replaying; everything else is regenerated by the server.
+_REPLAYED_HEADERS = (b"content-type",)
+
+
+async def ensure_idempotency_indexes(collection, ttl_hours: int):
+    await ensure_ttl_index(collection, "created_at", ttl_hours * 3600)
+
+
+def _header(scope, name: bytes):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class _BodyFingerprint:
+    """SHA-256 of a body fed in pieces, with any multipart boundary left out.
+
+    Clients pick a fresh boundary per attempt, so it must not change the hash.
+    The last ``len(boundary) - 1`` bytes are held back between pieces so a
+    boundary split across two pieces is still removed.
+    """
+
+    def __init__(self, scope):
+        self._hash = hashlib.sha256()
+        self._boundary = b""
+        self._tail = b""
+        content_type = _header(scope, b"content-type") or ""
+        if content_type.startswith("multipart/") and "boundary=" in content_type:
+            boundary = content_type.split("boundary=", 1)[1].split(";", 1)[0].strip('" ')
+            self._boundary = boundary.encode("latin-1")
+
+    def update(self, data: bytes):
+        if not self._boundary:
+            self._hash.update(data)
+            return
+        data = (self._tail + data).replace(self._boundary, b"")
+        split = max(0, len(data) - (len(self._boundary) - 1))
+        self._hash.update(data[:split])
+        self._tail = data[split:]
+
+    def hexdigest(self) -> str:
+        self._hash.update(self._tail)
+        self._tail = b""
+        return self._hash.hexdigest()
+
+
+async def _read_body(scope, receive):
+    """Drain the request body into a spool, hashing it on the way.
+
+    Returns the spool and the body fingerprint, or None for the fingerprint
+    when the client disconnected before sending the whole body.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=MAX_BUFFERED_BODY)
+    fingerprint = _BodyFingerprint(scope)
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            return spool, None
+        body = message.get("body", b"")
+        spool.write(body)
+        fingerprint.update(body)
+        if not message.get("more_body", False):
+            return spool, fingerprint.hexdigest()
+
+
+async def _send_json(send, status: int, body: bytes, extra_headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *extra_headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware replaying stored responses for repeated Idempotency-Keys.
+
+    ``get_collection`` returns the Motor collection holding the keys and
+    ``identify`` maps the ASGI scope to a verified caller id (or None), so a
+    key is only ever replayed to the caller who first used it.
+    """
+
+    def __init__(self, app, get_collection, identify, lease_seconds: int = 300,
+                 prefix: str = "/api", exclude=("/api/auth/",)):
+        self.app = app
+        self.get_collection = get_collection
+        self.identify = identify
+        self.lease_seconds = lease_seconds
+        self.prefix = prefix
+        self.exclude = tuple(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(self.prefix)
+            or scope["path"].startswith(self.exclude)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        key = _header(scope, b"idempotency-key")
+        caller = self.identify(scope) if key else None
+        if not key or caller is None:
+            # No key, or an unauthenticated caller the route will reject anyway.
+            await self.app(scope, receive, send)
+            return
+
+        collection = self.get_collection()
+        key_hash = hashlib.sha256(
+            f"{caller}:{scope['method']}:{scope['path']}:{key}".encode()
+        ).hexdigest()
+
+        spool, fingerprint = await _read_body(scope, receive)
+        try:
+            if fingerprint is not None:
+                await self._handle(scope, receive, send, spool, collection, key_hash, fingerprint)
+        finally:
+            spool.close()
+
+    async def _handle(self, scope, receive, send, spool, collection, key_hash: str, fingerprint: str):
+        spool_size = spool.tell()
+        spool.seek(0)
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            chunk = spool.read(REPLAY_CHUNK_SIZE)
+            replayed = spool.tell() >= spool_size
+            return {"type": "http.request", "body": chunk, "more_body": not replayed}
+
+        claim = str(ObjectId())
+        now = datetime.now(timezone.utc)
+        try:
+            await collection.insert_one({
+                "_id": key_hash,
+                "state": "pending",
+                "claim": claim,
+                "fingerprint": fingerprint,
+                "created_at": now,
+            })
+        except DuplicateKeyError:
+            stored = await collection.find_one({"_id": key_hash})
+            if stored is not None and stored.get("fingerprint", fingerprint) != fingerprint:
+                await _send_json(
+                    send, 422, b'{"detail":"Idempotency-Key was already used with a different request body"}'
+                )
+                return
+            if stored is not None and stored["state"] == "done":
+                headers = [(k.encode(), v.encode()) for k, v in stored["headers"]]
+                headers.append((b"content-length", str(len(stored["body"])).encode()))
+                headers.append((b"idempotent-replayed", b"true"))
+                await send({"type": "http.response.start", "status": stored["status"], "headers": headers})
+                await send({"type": "http.response.body", "body": stored["body"]})
+                return
+            # A pending claim past its lease was abandoned by a crashed worker; take it over.
+            taken = await collection.find_one_and_update(
+                {
+                    "_id": key_hash,
+                    "state": "pending",
+                    "created_at": {"$lt": now - timedelta(seconds=self.lease_seconds)},
+                },
+                {"$set": {"claim": claim, "fingerprint": fingerprint, "created_at": now}},
+            )
+            if taken is None:
+                await _send_json(
+                    send, 409, b'{"detail":"A request with this Idempotency-Key is still in progress"}',
+                    [(b"retry-after", b"1")]
+                )
+                return
+
+        # Only touch the key while this attempt still holds the claim.
+        owned = {"_id": key_hash, "claim": claim}
+
+        status = None
+        headers = []
+        body = bytearray()
+        cacheable = True
+
+        async def send_wrapper(message):
+            nonlocal status, headers, cacheable
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [
+                    (k.decode("latin-1"), v.decode("latin-1"))
+                    for k, v in message.get("headers", [])
+                    if k.lower() in _REPLAYED_HEADERS
+                ]
+            elif message["type"] == "http.response.body" and cacheable:
+                body.extend(message.get("body", b""))
+                if len(body) > MAX_STORED_RESPONSE:
+                    cacheable = False
+                    body.clear()
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, send_wrapper)
+        except BaseException:
+            await collection.delete_one(owned)
+            raise
+
+        if status is None or status >= 500 or not cacheable:
+            await collection.delete_one(owned)
+            return
+
+        await collection.update_one(
+            owned,
+            {"$set": {"state": "done", "status": status, "headers": headers, "body": bytes(body)}}
+        )
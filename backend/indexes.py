@@ -0,0 +1,24 @@
+"""Index helpers shared by the collections with configurable retention."""
+
+from pymongo.errors import OperationFailure
+
+# IndexOptionsConflict: same key, different options
+INDEX_OPTIONS_CONFLICT = 85
+
+
+async def ensure_ttl_index(collection, field: str, seconds: int):
+    """Create a TTL index on ``field``, or retune an existing one with ``collMod``.
+
+    ``create_index`` refuses to change ``expireAfterSeconds`` on an existing
+    index, so changing a retention setting after the first deploy would
+    otherwise stop the app from starting.
+    """
+    try:
+        await collection.create_index(field, expireAfterSeconds=seconds)
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT:
+            raise
+        await collection.database.command(
+            "collMod", collection.name,
+            index={"keyPattern": {field: 1}, "expireAfterSeconds": seconds},
+        )
@@ -0,0 +1,105 @@
+"""Cross-worker cache invalidation.
+
+Each worker process keeps its own in-process caches. ``InvalidationBroker``
+applies invalidations locally and, when more than one worker is running,
+appends them, one document per batch, to the capped ``cache_invalidations``
+collection. Every worker tails that collection and applies the invalidations
+published by the others.
+A capped collection works on a standalone ``mongod``; no replica set needed.
+
+ObjectIds from different processes are not ordered by insertion, so a
+re-opened tail resumes by position in the collection's natural (insertion)
+order rather than by ``_id``.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_COLLECTION = "cache_invalidations"
+INVALIDATION_COLLECTION_BYTES = 4 * 1024 * 1024
+
+
+class InvalidationBroker:
+    def __init__(self, distributed: bool):
+        self.distributed = distributed
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._subscribers: Dict[str, List[Callable]] = {}
+        self._db = None
+
+    def subscribe(self, channel: str, handler: Callable[[str], None]):
+        self._subscribers.setdefault(channel, []).append(handler)
+
+    def apply(self, channel: str, key: str):
+        """Apply an invalidation in this worker only."""
+        for handler in self._subscribers.get(channel, ()):
+            try:
+                handler(key)
+            except Exception as e:
+                logger.error(f"Invalidation handler for {channel} failed: {str(e)}")
+
+    async def publish(self, channel: str, key: str):
+        await self.publish_all([(channel, key)])
+
+    async def publish_all(self, invalidations: Iterable[Tuple[str, str]]):
+        invalidations = [[channel, key] for channel, key in invalidations]
+        for channel, key in invalidations:
+            self.apply(channel, key)
+        if invalidations and self.distributed and self._db is not None:
+            await self._db[INVALIDATION_COLLECTION].insert_one({
+                "invalidations": invalidations,
+                "origin": self.worker_id,
+                "ts": datetime.now(timezone.utc),
+            })
+
+    async def start(self, db):
+        """Create the capped collection and tail it until cancelled."""
+        self._db = db
+        if not self.distributed:
+            return
+        try:
+            await db.create_collection(
+                INVALIDATION_COLLECTION, capped=True, size=INVALIDATION_COLLECTION_BYTES
+            )
+        except CollectionInvalid:
+            pass
+        except OperationFailure as e:
+            # 48 NamespaceExists: another worker created it between the
+            # driver's existence check and the create
+            if e.code != 48:
+                raise
+        await self._tail(db[INVALIDATION_COLLECTION])
+
+    async def _tail(self, collection):
+        # Only invalidations published after this worker started matter.
+        latest = await collection.find_one({}, sort=[("$natural", -1)])
+        last_id = latest["_id"] if latest else None
+        while True:
+            # Re-read from the start in natural order and skip up to the last
+            # event applied. If that event has been overwritten, everything
+            # left is newer and applied; a repeated invalidation is harmless.
+            try:
+                skipping = last_id is not None and await collection.count_documents({"_id": last_id}, limit=1) > 0
+                cursor = collection.find({}, cursor_type=CursorType.TAILABLE_AWAIT)
+                async for event in cursor:
+                    if skipping:
+                        skipping = event["_id"] != last_id
+                        continue
+                    last_id = event["_id"]
+                    if event.get("origin") != self.worker_id:
+                        for channel, key in event.get("invalidations", ()):
+                            self.apply(channel, key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Invalidation tail failed: {str(e)}")
+            # A tailable cursor dies on an empty collection or a lost connection.
+            await asyncio.sleep(1)
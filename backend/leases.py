@@ -0,0 +1,32 @@
+"""Leases that keep periodic jobs on a single worker.
+
+Every worker process starts the same background loops. Jobs that must not
+run concurrently (archiving, garbage collection) call ``acquire_lease`` at
+the top of each pass: the first worker to claim ``job_leases.<name>`` holds
+it and renews it every pass; the others skip. When the holder dies its lease
+lapses and the next worker to try takes over.
+"""
+
+import os
+import socket
+from datetime import datetime, timezone, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+# Identifies this process as a lease holder.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def acquire_lease(db, name: str, seconds: int) -> bool:
+    """Claim or renew the lease ``name`` for ``seconds``; False if another worker holds it."""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.job_leases.update_one(
+            {"_id": name, "$or": [{"holder": WORKER_ID}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"holder": WORKER_ID, "expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # Lease exists, held by someone else and not expired
+        return False
+    return True
@@ -0,0 +1,154 @@
+"""Engineer membership index and workload view.
+
+``memberships`` holds one edge per engineer and project, tagged with where
+the membership comes from: ``source: "project"`` for a direct assignment
+(``assigned_engineers``) or the team id for a team. Projects and teams keep
+their own arrays; the edges are maintained alongside them so "what is this
+engineer working on" is one indexed lookup instead of a scan of both
+collections.
+
+``workload`` builds each engineer's projects, active phases, pending drawings
+and pending materials in a single aggregation over the edges (``$lookup`` with
+``localField`` and a sub-pipeline, MongoDB 5.0+).
+"""
+
+from typing import Iterable, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+
+PROJECT_SOURCE = "project"
+
+# Schedule status set by update_schedule_progress while a phase is under way.
+ACTIVE_PHASE_STATUS = "Ongoing"
+
+
+def _edge_upserts(project_id: str, engineer_ids: Iterable[str], source: str, team_id: Optional[str]) -> list:
+    return [
+        UpdateOne(
+            {"engineer_id": engineer_id, "project_id": project_id, "source": source},
+            {"$set": {"team_id": team_id}},
+            upsert=True,
+        )
+        for engineer_id in set(engineer_ids)
+    ]
+
+
+async def ensure_membership_indexes(db):
+    await db.memberships.create_index(
+        [("engineer_id", ASCENDING), ("project_id", ASCENDING), ("source", ASCENDING)], unique=True
+    )
+    await db.memberships.create_index([("project_id", ASCENDING), ("source", ASCENDING)])
+    # Foreign keys the workload lookups join on.
+    await db.projects.create_index("project_id")
+    await db.schedules.create_index([("project_id", ASCENDING), ("status", ASCENDING)])
+    await db.drawings.create_index([("engineer_id", ASCENDING), ("status", ASCENDING)])
+    await db.materials.create_index([("engineer_id", ASCENDING), ("status", ASCENDING)])
+
+    if await db.memberships.estimated_document_count() == 0:
+        await rebuild_memberships(db)
+
+
+async def rebuild_memberships(db):
+    """Backfill edges from ``projects.assigned_engineers`` and ``teams.engineer_ids``."""
+    requests = []
+    async for project in db.projects.find({}, {"_id": 0, "project_id": 1, "assigned_engineers": 1}):
+        requests += _edge_upserts(project["project_id"], project.get("assigned_engineers", []), PROJECT_SOURCE, None)
+    async for team in db.teams.find({}, {"_id": 0, "team_id": 1, "project_id": 1, "engineer_ids": 1}):
+        requests += _edge_upserts(team["project_id"], team.get("engineer_ids", []), team["team_id"], team["team_id"])
+    if requests:
+        await db.memberships.bulk_write(requests, ordered=False)
+
+
+async def set_project_engineers(db, project_id: str, engineer_ids: List[str]):
+    """Mirror a replaced ``assigned_engineers`` list."""
+    await db.memberships.delete_many(
+        {"project_id": project_id, "source": PROJECT_SOURCE, "engineer_id": {"$nin": engineer_ids}}
+    )
+    requests = _edge_upserts(project_id, engineer_ids, PROJECT_SOURCE, None)
+    if requests:
+        await db.memberships.bulk_write(requests, ordered=False)
+
+
+async def add_team(db, team_id: str, project_id: str, engineer_ids: List[str]):
+    requests = _edge_upserts(project_id, engineer_ids, team_id, team_id)
+    if requests:
+        await db.memberships.bulk_write(requests, ordered=False)
+
+
+async def remove_project(db, project_id: str):
+    await db.memberships.delete_many({"project_id": project_id})
+
+
+def workload_pipeline(engineer_ids: List[str], project_ids: Optional[List[str]] = None) -> list:
+    """``project_ids`` limits edges, drawings and materials to those projects."""
+    edges = {"engineer_id": {"$in": engineer_ids}}
+    pending = {"status": "Pending"}
+    if project_ids is not None:
+        edges["project_id"] = {"$in": project_ids}
+        pending["project_id"] = {"$in": project_ids}
+    return [
+        {"$match": edges},
+        {"$group": {
+            "_id": "$engineer_id",
+            "project_ids": {"$addToSet": "$project_id"},
+            "team_ids": {"$addToSet": "$team_id"},
+        }},
+        {"$lookup": {
+            "from": "projects",
+            "localField": "project_ids",
+            "foreignField": "project_id",
+            "pipeline": [
+                {"$project": {"_id": 0, "project_id": 1, "name": 1, "status": 1, "progress": 1, "end_date": 1}},
+            ],
+            "as": "projects",
+        }},
+        {"$lookup": {
+            "from": "schedules",
+            "localField": "project_ids",
+            "foreignField": "project_id",
+            "pipeline": [
+                {"$match": {"status": ACTIVE_PHASE_STATUS}},
+                {"$project": {"_id": 0, "schedule_id": 1, "project_id": 1, "phase_name": 1, "end_date": 1, "progress": 1}},
+            ],
+            "as": "active_phases",
+        }},
+        {"$lookup": {
+            "from": "drawings",
+            "localField": "_id",
+            "foreignField": "engineer_id",
+            "pipeline": [
+                {"$match": pending},
+                {"$project": {"_id": 0, "drawing_id": 1, "project_id": 1, "filename": 1, "upload_date": 1}},
+            ],
+            "as": "pending_drawings",
+        }},
+        {"$lookup": {
+            "from": "materials",
+            "localField": "_id",
+            "foreignField": "engineer_id",
+            "pipeline": [
+                {"$match": pending},
+                {"$project": {"_id": 0, "material_id": 1, "project_id": 1, "name": 1, "quantity": 1, "required_date": 1}},
+            ],
+            "as": "pending_materials",
+        }},
+        {"$project": {
+            "_id": 0,
+            "engineer_id": "$_id",
+            "team_ids": {"$setDifference": ["$team_ids", [None]]},
+            "projects": 1,
+            "active_phases": 1,
+            "pending_drawings": 1,
+            "pending_materials": 1,
+        }},
+    ]
+
+
+async def workload(db, engineer_ids: List[str], project_ids: Optional[List[str]] = None) -> List[dict]:
+    """Workload per engineer, in the order given; engineers without edges get empty lists."""
+    found = {
+        row["engineer_id"]: row
+        async for row in db.memberships.aggregate(workload_pipeline(engineer_ids, project_ids))
+    }
+    empty = {"team_ids": [], "projects": [], "active_phases": [], "pending_drawings": [], "pending_materials": []}
+    return [found.get(engineer_id, {"engineer_id": engineer_id, **empty}) for engineer_id in engineer_ids]
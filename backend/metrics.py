@@ -0,0 +1,415 @@
+"""In-process metrics for the BuildTrack API.
+
+Keeps a small registry of counters and histograms and renders it in the
+Prometheus text exposition format for the ``/metrics`` endpoint. Two
+collectors feed it:
+
+* ``MetricsMiddleware`` - per-route request latency and status counts.
+* ``MongoCommandMetrics`` - a pymongo command listener recording count,
+  latency and documents returned per collection/operation, tagged with the
+  route that issued the query.
+* ``MongoPoolMetrics`` - a pymongo pool listener recording pool size,
+  checked-out connections and check-out wait time per server.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# ASGI scope of the request currently being served. Motor runs pymongo on a
+# thread pool but copies the calling context, so the command listener sees the
+# scope set by the middleware and can read the matched route from it.
+request_scope: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def get(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value:g}")
+        return "\n".join(lines)
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, *label_values: str, value: float):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., count, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *label_values: str, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [0] * len(self.buckets) + [0, 0.0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, f'le="{bound:g}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series[-2]}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_count{labels} {series[-2]}")
+            lines.append(f"{self.name}_sum{labels} {series[-1]:g}")
+        return "\n".join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+registry = Registry()
+
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP requests by route, method and status.", ("route", "method", "status")
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route and method.", ("route", "method")
+)
+mongo_commands_total = registry.counter(
+    "mongo_commands_total", "Mongo commands by collection, operation and route.", ("collection", "operation", "route")
+)
+mongo_command_failures_total = registry.counter(
+    "mongo_command_failures_total", "Failed Mongo commands by collection and operation.", ("collection", "operation")
+)
+mongo_command_duration_seconds = registry.histogram(
+    "mongo_command_duration_seconds", "Mongo command latency by collection, operation and route.",
+    ("collection", "operation", "route")
+)
+mongo_documents_returned_total = registry.counter(
+    "mongo_documents_returned_total", "Documents returned by collection, operation and route.", ("collection", "operation", "route")
+)
+emails_sent_total = registry.counter(
+    "emails_sent_total", "Notification emails by outcome.", ("outcome",)
+)
+notifications_created_total = registry.counter(
+    "notifications_created_total", "Notifications created by type.", ("type",)
+)
+notification_fanouts_total = registry.counter(
+    "notification_fanouts_total", "Notification fan-outs (one event to many users) by type.", ("type",)
+)
+notification_fanout_recipients = registry.histogram(
+    "notification_fanout_recipients", "Recipients per notification fan-out.", ("type",),
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500)
+)
+
+
+def record_fanout(type: str, recipients: int):
+    notification_fanouts_total.inc(type)
+    notification_fanout_recipients.observe(type, value=recipients)
+
+
+# ====================
+# HTTP MIDDLEWARE
+# ====================
+
+def route_template(scope) -> Optional[str]:
+    """Path template of the matched route, e.g. ``/api/projects/{project_id}``."""
+    route = scope.get("route")
+    return getattr(route, "path", None)
+
+
+def current_route() -> str:
+    """Route template of the request being served, ``-`` outside requests."""
+    scope = request_scope.get()
+    if scope is None:
+        return "-"
+    return route_template(scope) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency and status per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        token = request_scope.set(scope)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            # Unmatched paths are collapsed so scanners cannot blow up cardinality.
+            route = route_template(scope) or "unmatched"
+            http_requests_total.inc(route, scope["method"], str(status_code))
+            http_request_duration_seconds.observe(route, scope["method"], value=elapsed)
+            request_scope.reset(token)
+
+
+# ====================
+# MONGO COMMAND LISTENER
+# ====================
+
+# Commands whose first field names the target collection.
+_COLLECTION_COMMANDS = {
+    "find", "insert", "update", "delete", "aggregate", "count", "distinct",
+    "findAndModify", "createIndexes",
+}
+
+# Command fields holding the filter or pipeline worth logging for slow queries.
+_SHAPE_FIELDS = ("filter", "query", "pipeline", "updates", "deletes", "sort")
+
+
+def query_shape(value):
+    """Replace literal values with ``?`` so queries group by structure, not data."""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = [query_shape(item) for item in value]
+        # Collapse $in-style lists of scalars into a single placeholder.
+        return shapes[:1] if all(shape == "?" for shape in shapes) else shapes
+    return "?"
+
+
+def command_shape(command) -> dict:
+    return {field: query_shape(command[field]) for field in _SHAPE_FIELDS if field in command}
+
+
+def command_collection(event) -> Optional[str]:
+    """Collection targeted by a command event, or None for admin/handshake commands."""
+    name = event.command_name
+    if name in _COLLECTION_COMMANDS:
+        return str(event.command.get(name))
+    if name == "getMore":
+        return str(event.command.get("collection"))
+    return None
+
+
+def _documents_returned(command_name: str, reply) -> int:
+    cursor = reply.get("cursor")
+    if cursor is not None:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") else 0
+    if command_name in ("count", "insert", "update", "delete"):
+        return int(reply.get("n", 0))
+    return 0
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Records per-collection command metrics and logs slow queries with their shape."""
+
+    def __init__(self, slow_query_ms: float = 100):
+        self.slow_query_ms = slow_query_ms
+        self._pending: Dict[Tuple[int, int], tuple] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = command_collection(event)
+        if collection is None:
+            return
+        with self._lock:
+            self._pending[(event.request_id, event.operation_id)] = (
+                collection, event.command_name, current_route(), command_shape(event.command)
+            )
+
+    def _pop(self, event):
+        with self._lock:
+            return self._pending.pop((event.request_id, event.operation_id), None)
+
+    def succeeded(self, event):
+        pending = self._pop(event)
+        if pending is None:
+            return
+        collection, name, route, shape = pending
+        seconds = event.duration_micros / 1_000_000
+        mongo_commands_total.inc(collection, name, route)
+        mongo_command_duration_seconds.observe(collection, name, route, value=seconds)
+        mongo_documents_returned_total.inc(
+            collection, name, route, amount=_documents_returned(name, event.reply)
+        )
+        if seconds * 1000 >= self.slow_query_ms:
+            logger.warning(
+                f"Slow query {seconds * 1000:.1f}ms {name} {collection} route={route} shape={shape}"
+            )
+
+    def failed(self, event):
+        pending = self._pop(event)
+        if pending is None:
+            return
+        collection, name, route, shape = pending
+        mongo_command_failures_total.inc(collection, name)
+        logger.warning(f"Mongo {name} on {collection} failed route={route} shape={shape}: {event.failure}")
+
+
+# ====================
+# MONGO POOL LISTENER
+# ====================
+
+mongo_pool_max_size = registry.gauge(
+    "mongo_pool_max_size", "Configured maximum connections per server pool.", ("address",)
+)
+mongo_pool_connections = registry.gauge(
+    "mongo_pool_connections", "Open connections per server pool.", ("address",)
+)
+mongo_pool_checked_out = registry.gauge(
+    "mongo_pool_checked_out", "Connections currently checked out per server pool.", ("address",)
+)
+mongo_pool_checkout_wait_seconds = registry.histogram(
+    "mongo_pool_checkout_wait_seconds", "Time spent waiting to check out a connection.", ("address",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+)
+mongo_pool_checkout_failures_total = registry.counter(
+    "mongo_pool_checkout_failures_total", "Failed connection check-outs by reason.", ("address", "reason")
+)
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Pool size, utilisation and check-out wait time per server.
+
+    Checked-out close to max size together with growing wait times means the
+    pool, not the database, is the bottleneck. ``max_pool_size`` is the
+    client's setting: pymongo leaves options at their default out of
+    ``pool_created`` events.
+    """
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self._open: Dict[str, int] = {}
+        self._checked_out: Dict[str, int] = {}
+        # Check-out start and finish fire on the same (executor) thread.
+        self._waiting = threading.local()
+
+    @staticmethod
+    def _address(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def _adjust(self, counts: Dict[str, int], gauge: Gauge, address: str, delta: int):
+        with self._lock:
+            counts[address] = counts.get(address, 0) + delta
+            value = counts[address]
+        gauge.set(address, value=value)
+
+    def pool_created(self, event):
+        mongo_pool_max_size.set(self._address(event), value=event.options.get("maxPoolSize", self.max_pool_size))
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._adjust(self._open, mongo_pool_connections, self._address(event), 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._adjust(self._open, mongo_pool_connections, self._address(event), -1)
+
+    def connection_check_out_started(self, event):
+        self._waiting.start = time.perf_counter()
+
+    def _waited(self) -> float:
+        start = getattr(self._waiting, "start", None)
+        self._waiting.start = None
+        return 0.0 if start is None else time.perf_counter() - start
+
+    def connection_check_out_failed(self, event):
+        address = self._address(event)
+        mongo_pool_checkout_wait_seconds.observe(address, value=self._waited())
+        mongo_pool_checkout_failures_total.inc(address, str(event.reason))
+
+    def connection_checked_out(self, event):
+        address = self._address(event)
+        mongo_pool_checkout_wait_seconds.observe(address, value=self._waited())
+        self._adjust(self._checked_out, mongo_pool_checked_out, address, 1)
+
+    def connection_checked_in(self, event):
+        self._adjust(self._checked_out, mongo_pool_checked_out, self._address(event), -1)
@@ -0,0 +1,100 @@
+"""Retention for the ``notifications`` collection.
+
+The hot collection only keeps recent notifications:
+
+* read notifications carry a ``read_at`` date and are removed by a TTL index
+  ``NOTIFICATION_READ_TTL_DAYS`` after being read;
+* anything older than ``NOTIFICATION_ARCHIVE_DAYS`` is moved into
+  ``notification_archive``, one compact bucket document per user per month.
+
+Bucket writes skip notifications the bucket already holds, so a pass that
+is retried after a crash (or overlaps another worker's) leaves no duplicates.
+Only the worker holding the ``notification_archiver`` lease archives.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from indexes import ensure_ttl_index
+from leases import acquire_lease
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BATCH_SIZE = 500
+
+# Fields kept in archive buckets; user_id lives on the bucket itself.
+ARCHIVED_FIELDS = ("notification_id", "type", "title", "message", "read", "related_id", "created_at")
+
+
+async def ensure_notification_indexes(db, read_ttl_days: int):
+    await db.notifications.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+    await db.notifications.create_index([("user_id", ASCENDING), ("read", ASCENDING)])
+    await db.notifications.create_index("created_at")
+    await ensure_ttl_index(db.notifications, "read_at", read_ttl_days * 86400)
+    await db.notification_archive.create_index(
+        [("user_id", ASCENDING), ("month", DESCENDING)], unique=True
+    )
+
+
+def _append_new(items: list) -> list:
+    """Update pipeline appending the ``items`` whose notification_id the bucket lacks."""
+    existing = {"$ifNull": ["$notifications", []]}
+    return [
+        {"$set": {"notifications": {"$concatArrays": [existing, {"$filter": {
+            # $literal: titles and messages may start with "$"
+            "input": {"$literal": items},
+            "cond": {"$not": [{"$in": ["$$this.notification_id", {"$ifNull": ["$notifications.notification_id", []]}]}]},
+        }}]}}},
+        {"$set": {"count": {"$size": "$notifications"}}},
+    ]
+
+
+async def archive_notifications(db, older_than_days: int) -> int:
+    """Move notifications older than ``older_than_days`` into monthly buckets."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).isoformat()
+    archived = 0
+
+    while True:
+        batch = await db.notifications.find(
+            {"created_at": {"$lt": cutoff}},
+            {"_id": 0, "user_id": 1, **{field: 1 for field in ARCHIVED_FIELDS}}
+        ).sort("created_at", ASCENDING).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+        if not batch:
+            return archived
+
+        buckets = {}
+        for notification in batch:
+            key = (notification["user_id"], notification["created_at"][:7])
+            buckets.setdefault(key, []).append(
+                {field: notification.get(field) for field in ARCHIVED_FIELDS}
+            )
+
+        await db.notification_archive.bulk_write([
+            UpdateOne({"user_id": user_id, "month": month}, _append_new(items), upsert=True)
+            for (user_id, month), items in buckets.items()
+        ], ordered=False)
+
+        # Only delete after the buckets are written; a crash in between means
+        # the batch is archived again next pass, and _append_new skips it.
+        await db.notifications.delete_many(
+            {"notification_id": {"$in": [n["notification_id"] for n in batch]}}
+        )
+        archived += len(batch)
+
+
+async def run_archiver(db, interval: int, older_than_days: int):
+    while True:
+        try:
+            archived = 0
+            if await acquire_lease(db, "notification_archiver", interval * 2):
+                archived = await archive_notifications(db, older_than_days)
+            if archived:
+                logger.info(f"Archived {archived} notifications")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Notification archiving failed: {str(e)}")
+        await asyncio.sleep(interval)
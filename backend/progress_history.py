@@ -0,0 +1,113 @@
+"""Progress history for projects and schedule phases.
+
+Every progress change is appended to ``progress_history`` (a Mongo
+time-series collection where the server supports it, a plain collection
+otherwise) and folded into pre-aggregated daily and weekly buckets in
+``progress_buckets``. Charts read the buckets, never the raw samples.
+
+Phase samples carry their ``schedule_id``; project-level samples (direct
+updates and the phase average) use ``schedule_id: None``.
+"""
+
+import asyncio
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+INTERVALS = ("daily", "weekly")
+
+
+def bucket_key(ts: datetime, interval: str) -> str:
+    if interval == "weekly":
+        ts = ts - timedelta(days=ts.weekday())
+    return ts.strftime("%Y-%m-%d")
+
+
+async def ensure_progress_collections(db):
+    try:
+        await db.create_collection(
+            "progress_history",
+            timeseries={"timeField": "ts", "metaField": "meta", "granularity": "hours"},
+        )
+    except CollectionInvalid:
+        pass  # already exists
+    except OperationFailure:
+        # Servers before 5.0 have no time-series collections; a plain
+        # collection with a compound index serves the same queries.
+        await db.progress_history.create_index(
+            [("meta.project_id", ASCENDING), ("meta.schedule_id", ASCENDING), ("ts", ASCENDING)]
+        )
+    await db.progress_buckets.create_index(
+        [("project_id", ASCENDING), ("schedule_id", ASCENDING), ("interval", ASCENDING), ("bucket", ASCENDING)],
+        unique=True,
+    )
+
+
+async def record_progress(db, project_id: str, schedule_id: Optional[str], progress: float, user_id: str):
+    """Append one sample and update its daily and weekly buckets."""
+    now = datetime.now(timezone.utc)
+    sample = {
+        "ts": now,
+        "meta": {"project_id": project_id, "schedule_id": schedule_id},
+        "progress": progress,
+        "user_id": user_id,
+    }
+    await asyncio.gather(
+        db.progress_history.insert_one(sample),
+        *[
+            db.progress_buckets.update_one(
+                {
+                    "project_id": project_id,
+                    "schedule_id": schedule_id,
+                    "interval": interval,
+                    "bucket": bucket_key(now, interval),
+                },
+                {
+                    "$setOnInsert": {"first": progress},
+                    "$set": {"last": progress, "last_at": now},
+                    "$min": {"min": progress},
+                    "$max": {"max": progress},
+                    "$inc": {"samples": 1},
+                },
+                upsert=True,
+            )
+            for interval in INTERVALS
+        ],
+    )
+
+
+async def progress_series(db, project_id: str, interval: str, schedule_id: Optional[str] = None,
+                          start: Optional[datetime] = None, end: Optional[datetime] = None) -> list:
+    """Buckets overlapping ``start``..``end`` (both inclusive), oldest first."""
+    query = {"project_id": project_id, "schedule_id": schedule_id, "interval": interval}
+    if start or end:
+        query["bucket"] = {}
+        if start:
+            query["bucket"]["$gte"] = bucket_key(start, interval)
+        if end:
+            query["bucket"]["$lte"] = bucket_key(end, interval)
+    return await db.progress_buckets.find(
+        query,
+        {"_id": 0, "bucket": 1, "first": 1, "last": 1, "min": 1, "max": 1, "samples": 1}
+    ).sort("bucket", ASCENDING).to_list(None)
+
+
+def history_pipeline(project_query) -> list:
+    """Aggregation flattening raw samples for export, oldest first."""
+    return [
+        {"$match": {"meta.project_id": project_query}},
+        {"$sort": {"ts": 1}},
+        {"$project": {
+            "_id": 0,
+            "project_id": "$meta.project_id",
+            "schedule_id": "$meta.schedule_id",
+            "progress": 1,
+            "user_id": 1,
+            "recorded_at": "$ts",
+        }},
+    ]
+
+
+HISTORY_COLUMNS = ["project_id", "schedule_id", "progress", "user_id", "recorded_at"]
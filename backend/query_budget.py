@@ -0,0 +1,156 @@
+"""Per-request Mongo query budget for development and test runs.
+
+``QueryBudgetListener`` counts every collection command issued while a request
+is being served; ``QueryBudgetMiddleware`` compares the count against a budget
+when the response starts. In ``warn`` mode an over-budget request is logged
+together with any query shape repeated ``QUERY_REPEAT_THRESHOLD`` times or more
+(the usual signature of an N+1 loop); in ``fail`` mode the response is
+replaced with a 500 carrying the same report, so benchmarks and tests catch
+routes that regress into per-item queries.
+
+Configured through ``Settings`` (environment names):
+
+* ``QUERY_BUDGET_MODE`` - ``off`` (default), ``warn`` or ``fail``
+* ``QUERY_BUDGET`` - default budget per request (25)
+* ``QUERY_BUDGET_ROUTES`` - per-route overrides, e.g.
+  ``POST /api/holidays=40,GET /api/materials=5``
+* ``QUERY_REPEAT_THRESHOLD`` - repeats of one shape reported as N+1 (5)
+"""
+
+import json
+import logging
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from pymongo import monitoring
+
+from metrics import command_collection, command_shape, route_template
+
+logger = logging.getLogger(__name__)
+
+def parse_route_budgets(value: str) -> Dict[str, int]:
+    budgets = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        route, budget = item.rsplit("=", 1)
+        budgets[route.strip()] = int(budget)
+    return budgets
+
+
+
+class QueryLog:
+    """Commands issued while serving one request, keyed by operation and shape."""
+
+    def __init__(self):
+        self.shapes: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, key: str):
+        with self._lock:
+            self.shapes[key] += 1
+
+    @property
+    def count(self) -> int:
+        return sum(self.shapes.values())
+
+    def repeated(self, threshold: int) -> List[dict]:
+        return [
+            {"query": key, "count": count}
+            for key, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+
+current_query_log: ContextVar[Optional[QueryLog]] = ContextVar("current_query_log", default=None)
+
+
+class QueryBudgetListener(monitoring.CommandListener):
+    def started(self, event):
+        log = current_query_log.get()
+        if log is None:
+            return
+        collection = command_collection(event)
+        if collection is None:
+            return
+        shape = json.dumps(command_shape(event.command), sort_keys=True, default=str)
+        log.record(f"{event.command_name} {collection} {shape}")
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class QueryBudgetMiddleware:
+    """Pure ASGI middleware enforcing the per-request query budget."""
+
+    def __init__(self, app, mode: str = "warn", budget: int = 25,
+                 route_budgets: Dict[str, int] = None, repeat_threshold: int = 5):
+        self.app = app
+        self.mode = mode
+        self.budget = budget
+        self.route_budgets = route_budgets or {}
+        self.repeat_threshold = repeat_threshold
+
+    def budget_for(self, method: str, route: str) -> int:
+        return self.route_budgets.get(f"{method} {route}", self.budget)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.mode not in ("warn", "fail"):
+            await self.app(scope, receive, send)
+            return
+
+        # Share the log with an outer trace capture, if any.
+        log = current_query_log.get()
+        token = None
+        if log is None:
+            log = QueryLog()
+            token = current_query_log.set(log)
+        replaced = False
+
+        async def send_wrapper(message):
+            nonlocal replaced
+            if replaced:
+                # The over-budget response was swapped out; drop the original body.
+                return
+            if message["type"] == "http.response.start":
+                route = route_template(scope) or scope["path"]
+                budget = self.budget_for(scope["method"], route)
+                count = log.count
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-count", str(count).encode()))
+                message = {**message, "headers": headers}
+                if count > budget:
+                    report = {
+                        "detail": "Query budget exceeded",
+                        "route": f"{scope['method']} {route}",
+                        "queries": count,
+                        "budget": budget,
+                        "repeated": log.repeated(self.repeat_threshold),
+                    }
+                    logger.warning(f"Query budget exceeded: {json.dumps(report)}")
+                    if self.mode == "fail":
+                        replaced = True
+                        body = json.dumps(report).encode()
+                        await send({
+                            "type": "http.response.start",
+                            "status": 500,
+                            "headers": [
+                                (b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode()),
+                                (b"x-query-count", str(count).encode()),
+                            ],
+                        })
+                        await send({"type": "http.response.body", "body": body})
+                        return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if token is not None:
+                current_query_log.reset(token)
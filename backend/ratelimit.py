@@ -0,0 +1,268 @@
+"""Token-bucket rate limiting and overload shedding.
+
+Each request is classified into a route class (``auth``, ``poll``,
+``upload``, ``chunk``, ``write``, ``read``) and charged one token from the
+bucket keyed by ``<class>:<user_id>``, or ``<class>:<client ip>`` for
+anonymous callers. An empty bucket answers 429 with ``Retry-After``.
+
+Before that, the middleware sheds load with 503 + ``Retry-After`` when the
+process already has ``MAX_IN_FLIGHT`` requests running or the event loop lags
+more than ``MAX_LOOP_LAG_MS`` behind (as measured by ``LoopLagMonitor``).
+
+Buckets live in a ``BucketStore``: ``InMemoryBucketStore`` for a single
+process, ``MongoBucketStore`` when several processes must share limits.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Dict, NamedTuple, Tuple
+
+from pymongo import ReturnDocument
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Never limited or shed, so monitoring keeps working under load.
+EXEMPT_PATHS = ("/metrics",)
+
+
+class RateLimit(NamedTuple):
+    capacity: int
+    per_seconds: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.per_seconds
+
+
+DEFAULT_RATE_LIMITS = {
+    "auth": RateLimit(10, 60),       # login/register, keyed by IP
+    "poll": RateLimit(60, 60),       # notifications, unread count, dashboard
+    "upload": RateLimit(20, 60),     # single-request uploads and upload sessions
+    "chunk": RateLimit(600, 60),     # resumable upload chunks
+    "write": RateLimit(120, 60),
+    "read": RateLimit(600, 60),
+}
+
+
+def parse_rate_limits(value: str) -> Dict[str, RateLimit]:
+    """Parse ``auth=10/60,poll=60/60`` (capacity/seconds) over the defaults."""
+    limits = dict(DEFAULT_RATE_LIMITS)
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        name, spec = item.split("=", 1)
+        capacity, per_seconds = spec.split("/", 1)
+        limits[name.strip()] = RateLimit(int(capacity), float(per_seconds))
+    return limits
+
+
+rate_limited_total = registry.counter(
+    "rate_limited_total", "Requests rejected with 429 by route class.", ("route_class",)
+)
+shed_total = registry.counter(
+    "shed_total", "Requests shed with 503 by reason.", ("reason",)
+)
+in_flight_requests = registry.gauge(
+    "in_flight_requests", "Requests currently being served."
+)
+event_loop_lag_seconds = registry.gauge(
+    "event_loop_lag_seconds", "Most recent event loop scheduling delay."
+)
+event_loop_lag_samples = registry.histogram(
+    "event_loop_lag_samples_seconds", "Distribution of sampled event loop scheduling delays.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+
+def route_class(method: str, path: str) -> str:
+    if path.startswith("/api/auth/") and method == "POST":
+        return "auth"
+    if path.startswith(("/api/notifications", "/api/dashboard")) and method == "GET":
+        return "poll"
+    if path.startswith("/api/drawings/uploads/") and method in ("PUT", "GET"):
+        return "chunk"
+    if path.startswith("/api/drawings/upload"):
+        return "upload"
+    return "read" if method in ("GET", "HEAD", "OPTIONS") else "write"
+
+
+# ====================
+# BUCKET STORES
+# ====================
+
+class BucketStore(ABC):
+    """Storage for token buckets; ``take`` atomically spends one token."""
+
+    @abstractmethod
+    async def take(self, key: str, limit: RateLimit) -> Tuple[bool, float]:
+        """Return ``(allowed, retry_after_seconds)``."""
+
+
+class InMemoryBucketStore(BucketStore):
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    async def take(self, key: str, limit: RateLimit) -> Tuple[bool, float]:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(limit.capacity), now]
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        tokens = min(limit.capacity, bucket[0] + (now - bucket[1]) * limit.rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return True, 0.0
+        bucket[0] = tokens
+        return False, (1 - tokens) / limit.rate
+
+
+class MongoBucketStore(BucketStore):
+    """Buckets shared across processes, updated atomically with a pipeline update."""
+
+    def __init__(self, get_collection):
+        self.get_collection = get_collection
+
+    async def ensure_indexes(self):
+        await self.get_collection().create_index("expires_at", expireAfterSeconds=0)
+
+    async def take(self, key: str, limit: RateLimit) -> Tuple[bool, float]:
+        now = time.time()
+        refilled = {"$min": [
+            limit.capacity,
+            {"$add": [
+                {"$ifNull": ["$tokens", limit.capacity]},
+                {"$multiply": [{"$subtract": [now, {"$ifNull": ["$ts", now]}]}, limit.rate]},
+            ]},
+        ]}
+        bucket = await self.get_collection().find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "ts": now}},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=limit.per_seconds),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if bucket["allowed"]:
+            return True, 0.0
+        return False, (1 - bucket["tokens"]) / limit.rate
+
+
+# ====================
+# LOOP LAG
+# ====================
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes up from a fixed-interval sleep."""
+
+    def __init__(self, interval: float = 0.25):
+        self.interval = interval
+        self.lag = 0.0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - start - self.interval)
+            event_loop_lag_seconds.set(value=self.lag)
+            event_loop_lag_samples.observe(value=self.lag)
+
+
+loop_lag_monitor = LoopLagMonitor()
+
+
+# ====================
+# MIDDLEWARE
+# ====================
+
+def client_ip(scope, trust_forwarded: bool = False) -> str:
+    if trust_forwarded:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+async def _reject(send, status: int, detail: str, retry_after: float):
+    body = ('{"detail":"%s"}' % detail).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware applying overload shedding, then per-caller token buckets."""
+
+    def __init__(self, app, identify, store: BucketStore = None, limits: Dict[str, RateLimit] = None,
+                 max_in_flight: int = 200, max_loop_lag_ms: float = 500, trust_forwarded: bool = False,
+                 monitor: LoopLagMonitor = loop_lag_monitor):
+        self.app = app
+        self.identify = identify
+        self.store = store or InMemoryBucketStore()
+        self.limits = limits or DEFAULT_RATE_LIMITS
+        self.trust_forwarded = trust_forwarded
+        self.max_in_flight = max_in_flight
+        self.max_loop_lag = max_loop_lag_ms / 1000
+        self.monitor = monitor
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        if self.in_flight >= self.max_in_flight:
+            shed_total.inc("in_flight")
+            await _reject(send, 503, "Server busy, retry shortly", 1)
+            return
+        if self.monitor.lag > self.max_loop_lag:
+            shed_total.inc("loop_lag")
+            await _reject(send, 503, "Server busy, retry shortly", self.monitor.lag)
+            return
+
+        name = route_class(scope["method"], scope["path"])
+        caller = None if name == "auth" else self.identify(scope)
+        key = f"{name}:{caller or client_ip(scope, self.trust_forwarded)}"
+        try:
+            allowed, retry_after = await self.store.take(key, self.limits[name])
+        except Exception as e:
+            # A broken shared store must not take the API down with it.
+            logger.error(f"Rate limit store failed: {str(e)}")
+            allowed, retry_after = True, 0.0
+        if not allowed:
+            rate_limited_total.inc(name)
+            await _reject(send, 429, "Too many requests", retry_after)
+            return
+
+        self.in_flight += 1
+        in_flight_requests.set(value=self.in_flight)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            in_flight_requests.set(value=self.in_flight)
@@ -0,0 +1,178 @@
+"""Anonymized request traces for replay-based performance checks.
+
+With ``TRACE_CAPTURE_FILE`` set, ``TraceCaptureMiddleware`` appends one JSON
+line per request (a ``TRACE_SAMPLE_RATE`` fraction of them) holding:
+
+* ``t`` - arrival time (Unix seconds), so replays keep the arrival pattern
+  across workers
+* ``worker`` - the capturing process; pseudonyms are only meaningful within
+  one worker, since every worker numbers its own
+* ``method``, ``route`` (the path template) and ``status``
+* ``user`` / ``role`` - a pseudonym (``u1``, ``u2``...) and the caller's role
+* ``path`` - path parameters as per-name pseudonyms (``p1``, ``p2``...), so
+  repeated hits on one project stay repeated hits on one replayed project
+* ``query`` - ``*_id`` parameters as pseudonyms like path parameters, the
+  values in ``SAFE_VALUES`` (enumerations, dates, numbers) as sent, and the
+  length of anything else
+* ``body_bytes``, ``duration_ms`` and ``mongo`` (command count per
+  ``<command> <collection>``)
+
+No ids, emails, search text or request bodies are written. Pseudonyms are
+per worker and per capture, so ``u1`` of two workers are different users. ``benchmarks/replay.py`` replays a trace
+against a seeded database and compares per-route latency with a baseline.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+from metrics import route_template
+from query_budget import QueryLog, current_query_log
+
+logger = logging.getLogger(__name__)
+
+# Parameters whose values are enumerations rather than user data.
+SAFE_VALUES = {
+    "view", "interval", "format", "role", "scope", "page", "limit", "dataset",
+    "month", "start", "end", "offset", "progress",
+}
+
+EXCLUDED_PATHS = ("/metrics",)
+
+
+class Pseudonyms:
+    """Stable per-capture stand-ins (``p1``, ``p2``...) for values of one kind."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._names: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, value: str) -> str:
+        with self._lock:
+            if value not in self._names:
+                self._names[value] = f"{self.prefix}{len(self._names) + 1}"
+            return self._names[value]
+
+
+class TraceWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # Line-buffered append: each record is one small write, so several
+        # workers can share a file.
+        self._file = open(path, "a", buffering=1)
+
+    def write(self, record: dict):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+
+class TraceCaptureMiddleware:
+    """Pure ASGI middleware writing one anonymized trace record per sampled request.
+
+    ``identify`` maps an ASGI scope to the caller's token payload (or None).
+    """
+
+    def __init__(self, app, identify: Callable[[dict], Optional[dict]],
+                 path: str, sample_rate: float = 1.0):
+        self.app = app
+        self.identify = identify
+        self.sample_rate = sample_rate
+        self.writer = TraceWriter(path)
+        self.worker = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.users = Pseudonyms("u")
+        self._params: Dict[str, Pseudonyms] = {}
+
+    def _pseudonym(self, name: str, value: str) -> str:
+        if name in SAFE_VALUES:
+            return value
+        if name not in self._params:
+            self._params[name] = Pseudonyms(name[:1] or "x")
+        return self._params[name](value)
+
+    def _query(self, scope) -> dict:
+        query = {}
+        raw = scope.get("query_string", b"").decode("latin-1")
+        for item in filter(None, raw.split("&")):
+            name, _, value = item.partition("=")
+            if name in SAFE_VALUES or name.endswith("_id"):
+                query[name] = self._pseudonym(name, value)
+            else:
+                query[name] = len(value)
+        return query
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"] in EXCLUDED_PATHS
+            or random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        arrived = time.time()
+        status_code = 500
+        body_bytes = 0
+        # Shared with QueryBudgetMiddleware when both are enabled.
+        log = current_query_log.get()
+        token = None
+        if log is None:
+            log = QueryLog()
+            token = current_query_log.set(log)
+
+        async def receive_wrapper():
+            nonlocal body_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                body_bytes += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            if token is not None:
+                current_query_log.reset(token)
+            try:
+                self._record(scope, arrived, status_code, body_bytes, duration, log)
+            except Exception as e:
+                logger.error(f"Trace capture failed: {str(e)}")
+
+    def _record(self, scope, arrived: float, status_code: int, body_bytes: int, duration: float, log: QueryLog):
+        payload = self.identify(scope) or {}
+        mongo: Dict[str, int] = {}
+        for key, count in log.shapes.items():
+            op = " ".join(key.split(" ", 2)[:2])
+            mongo[op] = mongo.get(op, 0) + count
+
+        self.writer.write({
+            "t": round(arrived, 4),
+            "worker": self.worker,
+            "method": scope["method"],
+            "route": route_template(scope) or "unmatched",
+            "status": status_code,
+            "user": self.users(payload["user_id"]) if "user_id" in payload else None,
+            "role": payload.get("role"),
+            "path": {
+                name: self._pseudonym(name, str(value))
+                for name, value in scope.get("path_params", {}).items()
+            },
+            "query": self._query(scope),
+            "body_bytes": body_bytes,
+            "duration_ms": round(duration * 1000, 3),
+            "mongo": mongo,
+        })
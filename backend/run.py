@@ -0,0 +1,41 @@
+"""Production entry point.
+
+Starts uvicorn with ``WEB_CONCURRENCY`` worker processes, each building its
+own app (and Motor pool) through ``server.create_app``::
+
+    cd backend
+    WEB_CONCURRENCY=4 python run.py
+
+Per-worker pool size defaults to ``MONGO_POOL_BUDGET / WEB_CONCURRENCY``
+(minimum 10) and can be pinned with ``MONGO_MAX_POOL_SIZE``. Use
+``RATE_LIMIT_STORE=mongo`` so rate limits are shared between workers;
+dashboard cache invalidations are broadcast automatically when more than
+one worker runs. Metrics are per process: ``/metrics`` reports the worker
+that answered the scrape, with ``event_loop_lag_*`` showing how close that
+worker is to saturation. Archiving and upload collection run in one worker
+at a time, coordinated through ``job_leases``.
+"""
+
+import os
+
+import uvicorn
+
+from settings import Settings
+
+
+def main():
+    # from_env loads .env first, so workers and pool sizing agree
+    workers = Settings.from_env().web_concurrency
+    uvicorn.run(
+        "server:create_app",
+        factory=True,
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', '8001')),
+        workers=workers,
+        proxy_headers=True,
+        log_level=os.environ.get('LOG_LEVEL', 'info'),
+    )
+
+
+if __name__ == "__main__":
+    main()
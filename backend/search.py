@@ -0,0 +1,103 @@
+"""Ranked full-text search over projects, drawings and materials.
+
+Backed by one Mongo text index per collection. Callers pass the role filter
+for each collection (the same filters the list routes use), so search never
+returns anything the list endpoints would hide.
+"""
+
+import asyncio
+
+from pymongo import TEXT
+
+# Searchable collections: id field, fields shown in results, text index spec.
+SEARCH_TARGETS = {
+    "projects": {
+        "id": "project_id",
+        "title": "name",
+        "subtitle": "location",
+        "index": [("name", TEXT), ("location", TEXT)],
+        "weights": {"name": 3, "location": 1},
+    },
+    "drawings": {
+        "id": "drawing_id",
+        "title": "filename",
+        "subtitle": "status",
+        "index": [("filename", TEXT)],
+        "weights": {"filename": 1},
+    },
+    "materials": {
+        "id": "material_id",
+        "title": "name",
+        "subtitle": "status",
+        "index": [("name", TEXT)],
+        "weights": {"name": 1},
+    },
+}
+
+# Deepest result offset served (the route rejects pages past it with a 400);
+# ranking merges the top page*limit hits of every collection, so this bounds
+# the work per request.
+MAX_SEARCH_WINDOW = 1000
+
+
+async def ensure_search_indexes(db):
+    for collection, target in SEARCH_TARGETS.items():
+        await db[collection].create_index(
+            target["index"], weights=target["weights"], name=f"{collection}_text"
+        )
+
+
+async def _search_collection(db, collection: str, text: str, scope: dict, window: int):
+    target = SEARCH_TARGETS[collection]
+    query = {"$text": {"$search": text}, **scope}
+    fields = {
+        "_id": 0,
+        target["id"]: 1,
+        target["title"]: 1,
+        target["subtitle"]: 1,
+        "project_id": 1,
+        "score": {"$meta": "textScore"},
+    }
+    hits, total = await asyncio.gather(
+        db[collection].find(query, fields)
+        .sort([("score", {"$meta": "textScore"})])
+        .limit(window)
+        .to_list(window),
+        db[collection].count_documents(query),
+    )
+    results = [
+        {
+            "type": collection[:-1],
+            "id": hit[target["id"]],
+            "title": hit.get(target["title"]),
+            "subtitle": hit.get(target["subtitle"]),
+            "project_id": hit.get("project_id"),
+            "score": hit["score"],
+        }
+        for hit in hits
+    ]
+    return results, total
+
+
+async def search(db, text: str, scopes: dict, page: int = 1, limit: int = 20) -> dict:
+    """Search every collection in ``scopes`` (collection -> role filter) and merge by score.
+
+    ``page * limit`` must not exceed ``MAX_SEARCH_WINDOW``.
+    """
+    window = page * limit
+    found = await asyncio.gather(*[
+        _search_collection(db, collection, text, scope, window)
+        for collection, scope in scopes.items()
+    ])
+
+    results = [hit for hits, _ in found for hit in hits]
+    results.sort(key=lambda hit: hit["score"], reverse=True)
+    offset = (page - 1) * limit
+
+    return {
+        "query": text,
+        "page": page,
+        "limit": limit,
+        "total": sum(total for _, total in found),
+        "results": results[offset:offset + limit],
+    }
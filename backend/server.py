@@ -1,40 +1,82 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import (
+    FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Query, BackgroundTasks, Request,
+    Header, Response,
+)
+from fastapi.responses import PlainTextResponse, ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
-from pydantic import BaseModel, EmailStr, Field
-from typing import List, Optional
-import os
+from pymongo import ReturnDocument
+from pymongo.read_preferences import SecondaryPreferred
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator, model_validator
+from typing import ClassVar, List, Literal, Optional
 import logging
-from pathlib import Path
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 import jwt
 import bcrypt
 import asyncio
-import resend
+from contextlib import asynccontextmanager
 from bson import ObjectId
 import io
-
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-fs = AsyncIOMotorGridFSBucket(db)
+from metrics import (
+    registry, MetricsMiddleware, MongoCommandMetrics, MongoPoolMetrics,
+    emails_sent_total, notifications_created_total, record_fanout,
+)
+from cache import TTLCache, ALL_KEYS
+from compression import CompressionMiddleware
+from idempotency import IdempotencyMiddleware, ensure_idempotency_indexes
+from notification_retention import ensure_notification_indexes, run_archiver
+from export import EXPORT_FORMATS, stream_export
+from search import MAX_SEARCH_WINDOW, SEARCH_TARGETS, ensure_search_indexes, search
+from progress_history import (
+    INTERVALS, HISTORY_COLUMNS, ensure_progress_collections, record_progress,
+    progress_series, history_pipeline,
+)
+from uploads import (
+    chunk_count, ensure_upload_indexes, open_session, get_session, write_chunks,
+    missing_chunks, finalize, recover_session, close_session, run_upload_collector,
+)
+from concurrency import etag, parse_if_match, version_filter, conflict
+from memberships import ensure_membership_indexes, set_project_engineers, add_team, remove_project, workload
+from ratelimit import RateLimitMiddleware, InMemoryBucketStore, MongoBucketStore, loop_lag_monitor, parse_rate_limits
+from invalidation import InvalidationBroker
+from events import WriteEvent, WriteEventBus
+from query_budget import QueryBudgetListener, QueryBudgetMiddleware, parse_route_budgets
+from request_trace import TraceCaptureMiddleware
+from settings import Settings
+
+# Configured by create_app(); the Mongo client, database and GridFS bucket are
+# opened by the app's lifespan, so importing this module needs no environment.
+# db_read serves read-only lists, stats, search and export and may be routed
+# to secondaries (see Settings.mongo_read_secondary). Writes, notifications
+# and anything that fills a cache use db, so stale reads are never cached.
+settings = Settings()
+client = None
+db = None
+db_read = None
+fs = None
+
+def reader(primary: bool = False):
+    return db if primary else db_read
 
 # JWT Config
-JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key')
+JWT_SECRET = settings.jwt_secret
 JWT_ALGORITHM = "HS256"
 
-# Resend Config
-resend.api_key = os.environ.get('RESEND_API_KEY')
-SENDER_EMAIL = os.environ.get('SENDER_EMAIL', 'onboarding@resend.dev')
+# Per-user dashboard payloads (see get_dashboard)
+dashboard_cache = TTLCache(ttl=settings.dashboard_cache_seconds)
+
+# Holiday dates used for end-date calculation (see load_holiday_dates)
+holiday_cache = TTLCache(ttl=settings.holiday_cache_seconds, max_entries=1)
+
+# Cache invalidations reach every worker when more than one is running
+invalidation_broker = InvalidationBroker(distributed=False)
+invalidation_broker.subscribe("dashboard", dashboard_cache.invalidate)
+invalidation_broker.subscribe("holidays", holiday_cache.invalidate)
+
+# Mutating routes publish here; rules (see WRITE EVENTS) map writes to invalidations
+write_events = WriteEventBus(invalidation_broker)
 
-# Create the main app
-app = FastAPI()
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
@@ -73,6 +115,49 @@ class ProjectCreate(BaseModel):
     budget: float
 
 
+class PatchModel(BaseModel):
+    """Partial update: fields left out stay as they are.
+
+    Unknown fields are rejected, and so are explicit nulls except for the
+    fields listed in ``nullable``, which a null clears.
+    """
+    model_config = ConfigDict(extra="forbid")
+    nullable: ClassVar[tuple] = ()
+
+    @model_validator(mode="before")
+    @classmethod
+    def reject_nulls(cls, data):
+        if isinstance(data, dict):
+            nulls = [name for name, value in data.items() if value is None and name not in cls.nullable]
+            if nulls:
+                raise ValueError(f"{', '.join(nulls)} cannot be null")
+        return data
+
+
+def iso_date(value: Optional[str]) -> Optional[str]:
+    """Validate a YYYY-MM-DD date, keeping the string form the documents store."""
+    if value is None:
+        return value
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError("must be a date in YYYY-MM-DD format")
+
+
+class ProjectUpdate(PatchModel):
+    """Fields an admin may change on a project; anything else is rejected."""
+
+    name: Optional[str] = None
+    client_email: Optional[str] = None
+    location: Optional[str] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    budget: Optional[float] = None
+    status: Optional[str] = None
+
+    validate_dates = field_validator("start_date", "end_date")(iso_date)
+
+
 class Project(BaseModel):
     project_id: str
     name: str
@@ -88,6 +173,7 @@ class Project(BaseModel):
     status: str = "Planning"
     assigned_engineers: List[str] = []
     progress: float = 0.0
+    version: int = 0
     created_at: str
 
 
@@ -150,8 +236,20 @@ class Schedule(BaseModel):
     description: Optional[str] = None
     progress: float = 0.0
     status: str = "Not Started"
+    version: int = 0
     created_at: str
 
+class ScheduleUpdate(PatchModel):
+    """Fields an admin may change on a phase; progress has its own route."""
+    nullable: ClassVar[tuple] = ("description",)
+
+    phase_name: Optional[str] = None
+    start_date: Optional[str] = None
+    duration: Optional[int] = Field(default=None, ge=1)
+    description: Optional[str] = None
+
+    validate_dates = field_validator("start_date")(iso_date)
+
 class HolidayCreate(BaseModel):
     name: str
     date: str
@@ -180,10 +278,50 @@ class ProgressUpdate(BaseModel):
     progress: float
     notes: Optional[str] = None
 
+class UploadSessionCreate(BaseModel):
+    project_id: str
+    filename: str
+    content_type: str
+    size: int
+
 class ApprovalAction(BaseModel):
     status: str
     comments: Optional[str] = None
 
+# ====================
+# RESPONSE HELPERS
+# ====================
+
+# Fields left out of list views requested with ?view=summary.
+SUMMARY_EXCLUDE = {"description", "admin_comments"}
+ListView = Literal["full", "summary"]
+
+def projection(model, view: ListView = "full", exclude=()) -> dict:
+    """Mongo projection returning exactly the fields of ``model``."""
+    excluded = set(exclude)
+    if view == "summary":
+        excluded |= SUMMARY_EXCLUDE
+    fields = {name: 1 for name in model.model_fields if name not in excluded}
+    return {"_id": 0, **fields}
+
+def trusted_response(documents, model, view: ListView = "full") -> ORJSONResponse:
+    """Serialize documents read from our own collections without re-validating them.
+
+    The projection already restricts them to the response model's fields, so
+    running them through Pydantic again only costs time on large lists. Fields
+    older documents lack get the model's default, as validation would give them.
+    """
+    excluded = SUMMARY_EXCLUDE if view == "summary" else set()
+    defaults = [
+        (name, field) for name, field in model.model_fields.items()
+        if name not in excluded and not field.is_required()
+    ]
+    for document in documents:
+        for name, field in defaults:
+            if name not in document:
+                document[name] = field.get_default(call_default_factory=True)
+    return ORJSONResponse(documents)
+
 # ====================
 # AUTH HELPERS
 # ====================
@@ -206,6 +344,24 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+def caller_payload(scope) -> Optional[dict]:
+    """Payload of a valid bearer token in an ASGI scope, for middleware."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return None
+            try:
+                return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+            except jwt.InvalidTokenError:
+                return None
+    return None
+
+def caller_id(scope) -> Optional[str]:
+    """user_id from a valid bearer token in an ASGI scope, for middleware."""
+    payload = caller_payload(scope)
+    return payload.get("user_id") if payload else None
+
 def require_role(allowed_roles: List[str]):
     def role_checker(payload: dict = Depends(verify_token)):
         if payload["role"] not in allowed_roles:
@@ -217,17 +373,33 @@ def require_role(allowed_roles: List[str]):
 # EMAIL SERVICE
 # ====================
 
+_resend = None
+
+def resend_client():
+    """Import and configure resend on first use; email-less deployments never load it."""
+    global _resend
+    if _resend is None:
+        import resend
+        resend.api_key = settings.resend_api_key
+        _resend = resend
+    return _resend
+
 async def send_email_notification(recipient_email: str, subject: str, html_content: str):
+    if not settings.email_enabled:
+        emails_sent_total.inc("disabled")
+        return
     try:
         params = {
-            "from": SENDER_EMAIL,
+            "from": settings.sender_email,
             "to": [recipient_email],
             "subject": subject,
             "html": html_content
         }
-        await asyncio.to_thread(resend.Emails.send, params)
+        await asyncio.to_thread(resend_client().Emails.send, params)
+        emails_sent_total.inc("sent")
         logger.info(f"Email sent to {recipient_email}")
     except Exception as e:
+        emails_sent_total.inc("failed")
         logger.error(f"Failed to send email: {str(e)}")
 
 # ====================
@@ -235,24 +407,98 @@ async def send_email_notification(recipient_email: str, subject: str, html_conte
 # ====================
 
 async def create_notification(user_id: str, type: str, title: str, message: str, related_id: str = None):
-    notification = {
-        "notification_id": str(ObjectId()),
-        "user_id": user_id,
-        "type": type,
-        "title": title,
-        "message": message,
-        "read": False,
-        "related_id": related_id,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    await db.notifications.insert_one(notification)
+    await notify_users([user_id], type, title, message, related_id)
+
+async def notify_users(user_ids: List[str], type: str, title: str, message: str, related_id: str = None):
+    """Fan one notification out to several users with a single insert and write event."""
+    if not user_ids:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    notifications = [
+        {
+            "notification_id": str(ObjectId()),
+            "user_id": user_id,
+            "type": type,
+            "title": title,
+            "message": message,
+            "read": False,
+            "related_id": related_id,
+            "created_at": now
+        }
+        for user_id in user_ids
+    ]
+    await db.notifications.insert_many(notifications)
+    notifications_created_total.inc(type, amount=len(notifications))
+    await write_events.publish_all([
+        WriteEvent("notifications", "insert", n["notification_id"], {"user_id": n["user_id"]})
+        for n in notifications
+    ])
     
-    # Get user email for email notification
-    user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
-    if user:
-        html = f"<h2>{title}</h2><p>{message}</p>"
+    if not settings.email_enabled:
+        return
+
+    # Get user emails for email notification
+    html = f"<h2>{title}</h2><p>{message}</p>"
+    async for user in db.users.find({"user_id": {"$in": user_ids}}, {"_id": 0, "email": 1}):
         await send_email_notification(user["email"], title, html)
 
+# ====================
+# WRITE EVENTS
+# ====================
+
+EVERY_DASHBOARD = [("dashboard", ALL_KEYS)]
+
+def dashboards(user_ids) -> list:
+    return [("dashboard", user_id) for user_id in user_ids if user_id]
+
+async def admin_ids() -> List[str]:
+    admins = await db.users.find({"role": "Admin"}, {"_id": 0, "user_id": 1}).to_list(100)
+    return [admin["user_id"] for admin in admins]
+
+async def user_dashboards(event: WriteEvent) -> list:
+    if event.key is None:
+        return EVERY_DASHBOARD
+    # ✅ New or removed accounts change the admins' engineer count
+    admins = await admin_ids() if event.op != "update" else []
+    return dashboards([event.key, *admins])
+
+async def project_dashboards(event: WriteEvent) -> list:
+    """Admins (global project stats), assigned engineers and the client."""
+    if event.key is None:
+        return EVERY_DASHBOARD
+    project = event.related
+    if "client_email" not in project:
+        project = await db.projects.find_one(
+            {"project_id": event.key}, {"_id": 0, "assigned_engineers": 1, "client_email": 1}
+        ) or {}
+
+    client = None
+    if project.get("client_email"):
+        client = await db.users.find_one({"email": project["client_email"]}, {"_id": 0, "user_id": 1})
+    admins = await admin_ids()
+    return dashboards([*admins, *project.get("assigned_engineers", []), client and client["user_id"]])
+
+async def approval_dashboards(event: WriteEvent) -> list:
+    """Drawings and materials: the engineer's stats and the admins' pending count."""
+    engineer_id = event.related.get("engineer_id")
+    if engineer_id is None:
+        return EVERY_DASHBOARD
+    return dashboards([engineer_id, *await admin_ids()])
+
+async def notification_dashboards(event: WriteEvent) -> list:
+    user_id = event.related.get("user_id")
+    return dashboards([user_id]) if user_id else EVERY_DASHBOARD
+
+async def holiday_calendar(event: WriteEvent) -> list:
+    return [("holidays", ALL_KEYS)]
+
+write_events.subscribe("users", user_dashboards)
+write_events.subscribe("projects", project_dashboards)
+write_events.subscribe("drawings", approval_dashboards)
+write_events.subscribe("materials", approval_dashboards)
+write_events.subscribe("notifications", notification_dashboards)
+write_events.subscribe("holidays", holiday_calendar)
+
 # ====================
 # AUTH ROUTES
 # ====================
@@ -264,8 +510,10 @@ async def register(user_data: UserRegister):
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Hash password
-    password_hash = bcrypt.hashpw(user_data.password.encode(), bcrypt.gensalt()).decode()
+    # Hash password (bcrypt is CPU-bound; keep it off the event loop)
+    password_hash = (
+        await asyncio.to_thread(bcrypt.hashpw, user_data.password.encode(), bcrypt.gensalt())
+    ).decode()
     
     user = {
         "user_id": str(ObjectId()),
@@ -278,6 +526,7 @@ async def register(user_data: UserRegister):
     }
     
     await db.users.insert_one(user)
+    await write_events.publish("users", "insert", user["user_id"])
     token = create_token(user["user_id"], user["role"])
     
     return {
@@ -295,7 +544,9 @@ async def register(user_data: UserRegister):
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email, "role": credentials.role}, {"_id": 0})
     
-    if not user or not bcrypt.checkpw(credentials.password.encode(), user["password_hash"].encode()):
+    if not user or not await asyncio.to_thread(
+        bcrypt.checkpw, credentials.password.encode(), user["password_hash"].encode()
+    ):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_token(user["user_id"], user["role"])
@@ -350,6 +601,7 @@ async def create_project(
         "status": "Planning",
         "assigned_engineers": [],
         "progress": 0.0,
+        "version": 1,
         "created_at": datetime.now(timezone.utc).isoformat(),
 
         # ✅ IMPORTANT: Owner Admin ID
@@ -357,44 +609,51 @@ async def create_project(
     }
 
     await db.projects.insert_one(project_data)
+    await write_events.publish(
+        "projects", "insert", project_data["project_id"],
+        assigned_engineers=[], client_email=project.client_email
+    )
 
     return Project(**project_data)
 
 
 # ============================
-# ✅ GET PROJECTS
+# ✅ PROJECT VISIBILITY
 # ============================
-@api_router.get("/projects", response_model=List[Project])
-async def get_projects(payload: dict = Depends(verify_token)):
 
+async def project_scope(payload: dict, user: dict = None) -> dict:
+    """Mongo filter for the projects the caller is allowed to see."""
     role = payload["role"]
     user_id = payload["user_id"]
 
     # ✅ Admin gets ONLY self-created projects
     if role == "Admin":
-        projects = await db.projects.find(
-            {"created_by_admin": user_id},
-            {"_id": 0}
-        ).to_list(1000)
+        return {"created_by_admin": user_id}
 
-    elif role == "Engineer":
-        projects = await db.projects.find(
-            {"assigned_engineers": user_id},
-            {"_id": 0}
-        ).to_list(1000)
+    if role == "Engineer":
+        return {"assigned_engineers": user_id}
 
-    else:
-        client_user = await db.users.find_one({"user_id": user_id})
+    if user is None:
+        user = await db_read.users.find_one({"user_id": user_id}, {"_id": 0, "email": 1})
 
-        if not client_user:
+        if not user:
             raise HTTPException(status_code=404, detail="Client not found")
 
-        projects = await db.projects.find(
-            {"client_email": client_user["email"]},
-            {"_id": 0}
-        ).to_list(1000)
+    return {"client_email": user["email"]}
 
-    return projects
+
+async def list_projects(payload: dict, view: ListView = "full", user: dict = None, primary: bool = False) -> list:
+    query = await project_scope(payload, user)
+    return await reader(primary).projects.find(query, projection(Project, view)).to_list(1000)
+
+
+# ============================
+# ✅ GET PROJECTS
+# ============================
+@api_router.get("/projects", response_model=List[Project])
+async def get_projects(view: ListView = "full", payload: dict = Depends(verify_token)):
+    projects = await list_projects(payload, view)
+    return trusted_response(projects, Project, view)
 
 
 
@@ -403,7 +662,7 @@ async def get_projects(payload: dict = Depends(verify_token)):
 # ============================
 
 @api_router.get("/projects/{project_id}", response_model=Project)
-async def get_project(project_id: str, payload: dict = Depends(verify_token)):
+async def get_project(project_id: str, response: Response, payload: dict = Depends(verify_token)):
 
     project = await db.projects.find_one(
         {"project_id": project_id},
@@ -418,6 +677,7 @@ async def get_project(project_id: str, payload: dict = Depends(verify_token)):
         if project["created_by_admin"] != payload["user_id"]:
             raise HTTPException(status_code=403, detail="Not allowed")
 
+    response.headers["ETag"] = etag(project.get("version", 0))
     return Project(**project)
 
 
@@ -428,19 +688,44 @@ async def get_project(project_id: str, payload: dict = Depends(verify_token)):
 @api_router.put("/projects/{project_id}")
 async def update_project(
     project_id: str,
-    updates: dict,
+    updates: ProjectUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     payload: dict = Depends(require_role(["Admin"]))
 ):
+    changes = updates.model_dump(exclude_unset=True)
+    if not changes:
+        raise HTTPException(status_code=400, detail="No fields to update")
 
-    result = await db.projects.update_one(
-        {"project_id": project_id},
-        {"$set": updates}
+    # ✅ Keep the denormalised client name in step with the email
+    if "client_email" in changes:
+        client_user = await db.users.find_one({"email": changes["client_email"]}, {"_id": 0, "name": 1})
+        if not client_user:
+            raise HTTPException(status_code=404, detail="Client not found")
+        changes["client_name"] = client_user["name"]
+
+    query = {"project_id": project_id}
+    expected = parse_if_match(if_match)
+    if expected is not None:
+        query.update(version_filter(expected))
+
+    project = await db.projects.find_one_and_update(
+        query,
+        {"$set": changes, "$inc": {"version": 1}},
+        projection={"_id": 0, "version": 1},
+        return_document=ReturnDocument.AFTER
     )
 
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Project not found")
+    if not project:
+        current = await db.projects.find_one({"project_id": project_id}, {"_id": 0, "version": 1})
+        if not current:
+            raise HTTPException(status_code=404, detail="Project not found")
+        raise conflict(current.get("version"))
+
+    await write_events.publish("projects", "update", project_id)
 
-    return {"message": "Project updated successfully"}
+    response.headers["ETag"] = etag(project["version"])
+    return {"message": "Project updated successfully", "version": project["version"]}
 
 
 # ============================
@@ -454,14 +739,24 @@ async def assign_engineers(
     payload: dict = Depends(require_role(["Admin"]))
 ):
 
-    result = await db.projects.update_one(
+    # ✅ The previous assignment is returned so unassigned engineers are invalidated too
+    previous = await db.projects.find_one_and_update(
         {"project_id": project_id},
-        {"$set": {"assigned_engineers": engineer_ids}}
+        {"$set": {"assigned_engineers": engineer_ids}},
+        projection={"_id": 0, "assigned_engineers": 1, "client_email": 1}
     )
 
-    if result.matched_count == 0:
+    if not previous:
         raise HTTPException(status_code=404, detail="Project not found")
 
+    # ✅ Keep the membership index in step
+    await set_project_engineers(db, project_id, engineer_ids)
+    await write_events.publish(
+        "projects", "update", project_id,
+        assigned_engineers=[*previous.get("assigned_engineers", []), *engineer_ids],
+        client_email=previous.get("client_email")
+    )
+
     return {"message": "Engineers assigned successfully"}
 
 
@@ -473,6 +768,7 @@ async def assign_engineers(
 async def update_progress(
     project_id: str,
     update: ProgressUpdate,
+    background: BackgroundTasks,
     payload: dict = Depends(require_role(["Engineer"]))
 ):
 
@@ -484,8 +780,51 @@ async def update_progress(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Project not found")
 
+    await write_events.publish("projects", "update", project_id)
+
+    # ✅ History is written after the response is sent
+    background.add_task(record_progress, db, project_id, None, update.progress, payload["user_id"])
+
     return {"message": "Progress updated successfully"}
 
+
+# ============================
+# ✅ PROGRESS HISTORY
+# ============================
+
+@api_router.get("/projects/{project_id}/progress/history")
+async def get_progress_history(
+    project_id: str,
+    interval: str = "daily",
+    schedule_id: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    payload: dict = Depends(verify_token)
+):
+    """Downsampled progress (first/last/min/max per bucket) for a project or one phase."""
+    if interval not in INTERVALS:
+        raise HTTPException(status_code=400, detail="Interval must be daily or weekly")
+    try:
+        start_at = datetime.fromisoformat(start) if start else None
+        end_at = datetime.fromisoformat(end) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be ISO dates (YYYY-MM-DD)")
+
+    visible = await db.projects.find_one(
+        {"project_id": project_id, **(await project_scope(payload))},
+        {"_id": 0, "project_id": 1}
+    )
+    if not visible:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    points = await progress_series(db_read, project_id, interval, schedule_id, start_at, end_at)
+    return {
+        "project_id": project_id,
+        "schedule_id": schedule_id,
+        "interval": interval,
+        "points": points,
+    }
+
 # ====================
 # TEAM ROUTES
 # ====================
@@ -498,17 +837,18 @@ async def create_team(team: TeamCreate, payload: dict = Depends(require_role(["A
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.teams.insert_one(team_data)
+    await add_team(db, team_data["team_id"], team.project_id, team.engineer_ids)
     return Team(**team_data)
 
 @api_router.get("/teams", response_model=List[Team])
 async def get_teams(payload: dict = Depends(require_role(["Admin"]))):
-    teams = await db.teams.find({}, {"_id": 0}).to_list(1000)
-    return teams
+    teams = await db_read.teams.find({}, projection(Team)).to_list(1000)
+    return trusted_response(teams, Team)
 
 @api_router.get("/users")
 async def get_users(role: Optional[str] = None, payload: dict = Depends(require_role(["Admin"]))):
     query = {"role": role} if role else {}
-    users = await db.users.find(query, {"_id": 0, "password_hash": 0}).to_list(1000)
+    users = await db_read.users.find(query, {"_id": 0, "password_hash": 0}).to_list(1000)
     return users
 
 # ====================
@@ -534,9 +874,14 @@ async def upload_drawing(
         io.BytesIO(content),
         metadata={"content_type": file.content_type}
     )
-    
+
+    drawing_id = await create_drawing(payload, project_id, file_id, file.filename)
+    return {"message": "Drawing uploaded successfully", "drawing_id": drawing_id}
+
+async def create_drawing(payload: dict, project_id: str, file_id, filename: str) -> str:
+    """Record an uploaded GridFS file as a pending drawing and notify admins."""
     # Get engineer info
-    engineer = await db.users.find_one({"user_id": payload["user_id"]}, {"_id": 0})
+    engineer = await db.users.find_one({"user_id": payload["user_id"]}, {"_id": 0, "name": 1})
     
     drawing = {
         "drawing_id": str(ObjectId()),
@@ -544,32 +889,108 @@ async def upload_drawing(
         "engineer_id": payload["user_id"],
         "engineer_name": engineer["name"],
         "file_id": str(file_id),
-        "filename": file.filename,
+        "filename": filename,
         "status": "Pending",
         "admin_comments": None,
         "upload_date": datetime.now(timezone.utc).isoformat()
     }
     
     await db.drawings.insert_one(drawing)
+    await write_events.publish("drawings", "insert", drawing["drawing_id"], engineer_id=payload["user_id"])
     
     # Notify all admins
-    admins = await db.users.find({"role": "Admin"}, {"_id": 0}).to_list(100)
-    for admin in admins:
-        await create_notification(
-            admin["user_id"],
-            "drawing_upload",
-            "New Drawing Uploaded",
-            f"{engineer['name']} uploaded {file.filename}",
-            drawing["drawing_id"]
-        )
-    
-    return {"message": "Drawing uploaded successfully", "drawing_id": drawing["drawing_id"]}
+    admins = await db.users.find({"role": "Admin"}, {"_id": 0, "user_id": 1}).to_list(100)
+    record_fanout("drawing_upload", len(admins))
+    await notify_users(
+        [admin["user_id"] for admin in admins],
+        "drawing_upload",
+        "New Drawing Uploaded",
+        f"{engineer['name']} uploaded {filename}",
+        drawing["drawing_id"]
+    )
 
-@api_router.get("/drawings", response_model=List[DrawingResponse])
-async def get_drawings(
-    project_id: Optional[str] = None,
-    payload: dict = Depends(verify_token)
+    return drawing["drawing_id"]
+
+# ============================
+# ✅ RESUMABLE UPLOADS
+# ============================
+
+def upload_status(session: dict, missing: list) -> dict:
+    return {
+        "upload_id": session["upload_id"],
+        "size": session["size"],
+        "chunk_size": session["chunk_size"],
+        "status": session["status"],
+        "missing_chunks": missing,
+        "drawing_id": session.get("drawing_id"),
+    }
+
+@api_router.post("/drawings/uploads")
+async def create_upload(
+    upload: UploadSessionCreate,
+    payload: dict = Depends(require_role(["Engineer"]))
+):
+    session = await open_session(
+        db, payload["user_id"], upload.project_id, upload.filename, upload.content_type, upload.size,
+        chunk_size=settings.upload_chunk_size,
+        max_size=settings.upload_max_size,
+        session_hours=settings.upload_session_hours,
+    )
+    return upload_status(session, list(range(chunk_count(session["size"], session["chunk_size"]))))
+
+@api_router.put("/drawings/uploads/{upload_id}")
+async def put_upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    payload: dict = Depends(require_role(["Engineer"]))
 ):
+    session = await get_session(db, upload_id, payload["user_id"])
+
+    # ✅ Read the body incrementally so an oversized PUT is refused early
+    limit = session["chunk_size"] * settings.upload_max_put_chunks
+    body = bytearray()
+    async for part in request.stream():
+        body += part
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail=f"At most {limit} bytes per request")
+
+    written = await write_chunks(db, session, offset, bytes(body), settings.upload_session_hours)
+    return {"offset": offset, "chunks_written": written}
+
+@api_router.get("/drawings/uploads/{upload_id}")
+async def get_upload(upload_id: str, payload: dict = Depends(require_role(["Engineer"]))):
+    session = await get_session(db, upload_id, payload["user_id"])
+    missing = await missing_chunks(db, session) if session["status"] == "open" else []
+    return upload_status(session, missing)
+
+@api_router.post("/drawings/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, payload: dict = Depends(require_role(["Engineer"]))):
+    session = await get_session(db, upload_id, payload["user_id"])
+
+    # ✅ Finalizing twice returns the same drawing
+    if session["status"] == "completed":
+        return {"message": "Drawing uploaded successfully", "drawing_id": session["drawing_id"]}
+
+    # ✅ An earlier attempt may have stored the drawing before its worker died
+    if session["status"] == "completing":
+        drawing = await db.drawings.find_one({"file_id": str(session["file_id"])}, {"_id": 0, "drawing_id": 1})
+        if drawing:
+            await close_session(db, upload_id, drawing["drawing_id"])
+            return {"message": "Drawing uploaded successfully", "drawing_id": drawing["drawing_id"]}
+
+    file_id = await finalize(db, session, settings.upload_session_hours, settings.upload_complete_timeout_seconds)
+    try:
+        drawing_id = await create_drawing(payload, session["project_id"], file_id, session["filename"])
+    except Exception:
+        # ✅ Drawing already stored (notifying failed): keep it; otherwise reopen for a retry
+        await recover_session(db, session, settings.upload_session_hours)
+        raise
+    await close_session(db, upload_id, drawing_id)
+    return {"message": "Drawing uploaded successfully", "drawing_id": drawing_id}
+
+def drawing_scope(payload: dict, project_id: Optional[str] = None) -> dict:
+    """Mongo filter for the drawings the caller is allowed to see."""
     query = {}
 
     # ✅ Project Filter
@@ -584,12 +1005,22 @@ async def get_drawings(
     if payload["role"] == "Client":
         query["status"] = "Approved"
 
-    drawings = await db.drawings.find(
+    return query
+
+@api_router.get("/drawings", response_model=List[DrawingResponse])
+async def get_drawings(
+    project_id: Optional[str] = None,
+    view: ListView = "full",
+    payload: dict = Depends(verify_token)
+):
+    query = drawing_scope(payload, project_id)
+
+    drawings = await db_read.drawings.find(
         query,
-        {"_id": 0, "file_id": 0}
+        projection(DrawingResponse, view)
     ).to_list(1000)
 
-    return drawings
+    return trusted_response(drawings, DrawingResponse, view)
 
 
 
@@ -598,7 +1029,6 @@ async def download_drawing(
     drawing_id: str,
     payload: dict = Depends(verify_token)
 ):
-    from fastapi.responses import StreamingResponse
 
     drawing = await db.drawings.find_one(
         {"drawing_id": drawing_id},
@@ -637,6 +1067,7 @@ async def approve_drawing(drawing_id: str, action: ApprovalAction, payload: dict
         {"drawing_id": drawing_id},
         {"$set": {"status": action.status, "admin_comments": action.comments}}
     )
+    await write_events.publish("drawings", "update", drawing_id, engineer_id=drawing["engineer_id"])
     
     # Notify engineer
     await create_notification(
@@ -655,7 +1086,7 @@ async def approve_drawing(drawing_id: str, action: ApprovalAction, payload: dict
 
 @api_router.post("/materials/request", response_model=Material)
 async def request_material(material: MaterialRequest, payload: dict = Depends(require_role(["Engineer"]))):
-    engineer = await db.users.find_one({"user_id": payload["user_id"]}, {"_id": 0})
+    engineer = await db.users.find_one({"user_id": payload["user_id"]}, {"_id": 0, "name": 1})
     
     material_data = {
         "material_id": str(ObjectId()),
@@ -668,24 +1099,22 @@ async def request_material(material: MaterialRequest, payload: dict = Depends(re
     }
     
     await db.materials.insert_one(material_data)
+    await write_events.publish("materials", "insert", material_data["material_id"], engineer_id=payload["user_id"])
     
     # Notify all admins
-    admins = await db.users.find({"role": "Admin"}, {"_id": 0}).to_list(100)
-    for admin in admins:
-        await create_notification(
-            admin["user_id"],
-            "material_request",
-            "New Material Request",
-            f"{engineer['name']} requested {material.name}",
-            material_data["material_id"]
-        )
+    admins = await db.users.find({"role": "Admin"}, {"_id": 0, "user_id": 1}).to_list(100)
+    record_fanout("material_request", len(admins))
+    await notify_users(
+        [admin["user_id"] for admin in admins],
+        "material_request",
+        "New Material Request",
+        f"{engineer['name']} requested {material.name}",
+        material_data["material_id"]
+    )
     
     return Material(**material_data)
-@api_router.get("/materials")
-async def get_materials(
-    project_id: Optional[str] = None,   # ✅ Add this
-    payload: dict = Depends(verify_token)
-):
+async def material_scope(payload: dict, project_id: Optional[str] = None) -> dict:
+    """Mongo filter for the material requests the caller is allowed to see."""
     query = {}
 
     # ✅ Project filter (Admin Page Project Wise)
@@ -698,9 +1127,9 @@ async def get_materials(
 
     # ✅ Admin only own created projects
     if payload["role"] == "Admin":
-        myProjects = await db.projects.find(
+        myProjects = await db_read.projects.find(
             {"created_by_admin": payload["user_id"]},
-            {"_id": 0}
+            {"_id": 0, "project_id": 1}
         ).to_list(100)
 
         projectIds = [p["project_id"] for p in myProjects]
@@ -712,8 +1141,17 @@ async def get_materials(
         else:
             query["project_id"] = {"$in": projectIds}
 
-    materials = await db.materials.find(query, {"_id": 0}).to_list(1000)
-    return materials
+    return query
+
+@api_router.get("/materials", response_model=List[Material])
+async def get_materials(
+    project_id: Optional[str] = None,   # ✅ Add this
+    view: ListView = "full",
+    payload: dict = Depends(verify_token)
+):
+    query = await material_scope(payload, project_id)
+    materials = await db_read.materials.find(query, projection(Material, view)).to_list(1000)
+    return trusted_response(materials, Material, view)
 
 @api_router.post("/materials/{material_id}/approve")
 async def approve_material(material_id: str, action: ApprovalAction, payload: dict = Depends(require_role(["Admin"]))):
@@ -725,6 +1163,7 @@ async def approve_material(material_id: str, action: ApprovalAction, payload: di
         {"material_id": material_id},
         {"$set": {"status": action.status, "admin_comments": action.comments}}
     )
+    await write_events.publish("materials", "update", material_id, engineer_id=material["engineer_id"])
     
     # Notify engineer
     await create_notification(
@@ -748,16 +1187,30 @@ async def approve_material(material_id: str, action: ApprovalAction, payload: di
 # ✅ Auto Remove Expired Holidays
 async def cleanup_old_holidays():
     today = datetime.now().strftime("%Y-%m-%d")
-    await db.holidays.delete_many({"date": {"$lt": today}})
+    result = await db.holidays.delete_many({"date": {"$lt": today}})
+    if result.deleted_count:
+        await write_events.publish("holidays", "delete", None)
+
+
+async def load_holiday_dates() -> set:
+    cached = holiday_cache.get("dates")
+    if cached is not None:
+        return cached
+
+    await cleanup_old_holidays()
+
+    holidays = await db.holidays.find({}, {"_id": 0, "date": 1}).to_list(500)
+    holiday_dates = {h["date"] for h in holidays}
+    holiday_cache.set("dates", holiday_dates)
+    return holiday_dates
 
 
 # ✅ Calculate End Date (Skip Sundays + Holidays)
 async def calculate_end_date(start_date: str, duration: int):
-    await cleanup_old_holidays()
+    return add_working_days(start_date, duration, await load_holiday_dates())
 
-    holidays = await db.holidays.find({}, {"_id": 0}).to_list(500)
-    holiday_dates = [h["date"] for h in holidays]
 
+def add_working_days(start_date: str, duration: int, holiday_dates: set) -> str:
     current = datetime.fromisoformat(start_date)
     count = 0
 
@@ -792,17 +1245,18 @@ async def create_holiday(
     }
 
     await db.holidays.insert_one(holiday_data)
+    await write_events.publish("holidays", "insert", holiday_data["holiday_id"])
 
     # ✅ Notify Engineers
-    engineers = await db.users.find({"role": "Engineer"}, {"_id": 0}).to_list(500)
-    for eng in engineers:
-        await create_notification(
-            eng["user_id"],
-            "holiday_added",
-            "New Holiday Added 📢",
-            f"Holiday declared on {holiday.date}. Scheduling will skip this date.",
-            holiday_data["holiday_id"]
-        )
+    engineers = await db.users.find({"role": "Engineer"}, {"_id": 0, "user_id": 1}).to_list(500)
+    record_fanout("holiday_added", len(engineers))
+    await notify_users(
+        [eng["user_id"] for eng in engineers],
+        "holiday_added",
+        "New Holiday Added 📢",
+        f"Holiday declared on {holiday.date}. Scheduling will skip this date.",
+        holiday_data["holiday_id"]
+    )
 
     return Holiday(**holiday_data)
 
@@ -811,8 +1265,8 @@ async def create_holiday(
 @api_router.get("/holidays", response_model=List[Holiday])
 async def get_holidays(payload: dict = Depends(verify_token)):
     await cleanup_old_holidays()
-    holidays = await db.holidays.find({}, {"_id": 0}).to_list(500)
-    return holidays
+    holidays = await db_read.holidays.find({}, projection(Holiday)).to_list(500)
+    return trusted_response(holidays, Holiday)
 
 
 # ✅ DELETE HOLIDAY
@@ -826,6 +1280,8 @@ async def delete_holiday(
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Holiday not found")
 
+    await write_events.publish("holidays", "delete", holiday_id)
+
     return {"message": "Holiday removed ✅"}
 
 
@@ -858,6 +1314,7 @@ async def create_schedule(
 
         "progress": 0.0,
         "status": "Not Started",
+        "version": 1,
 
         "created_at": datetime.now(timezone.utc).isoformat()
     }
@@ -865,15 +1322,15 @@ async def create_schedule(
     await db.schedules.insert_one(schedule_data)
 
     # ✅ Notify Engineers
-    engineers = await db.users.find({"role": "Engineer"}, {"_id": 0}).to_list(500)
-    for eng in engineers:
-        await create_notification(
-            eng["user_id"],
-            "schedule_added",
-            "New Phase Scheduled ✅",
-            f"Phase '{schedule.phase_name}' added. Timeline updated.",
-            schedule_data["schedule_id"]
-        )
+    engineers = await db.users.find({"role": "Engineer"}, {"_id": 0, "user_id": 1}).to_list(500)
+    record_fanout("schedule_added", len(engineers))
+    await notify_users(
+        [eng["user_id"] for eng in engineers],
+        "schedule_added",
+        "New Phase Scheduled ✅",
+        f"Phase '{schedule.phase_name}' added. Timeline updated.",
+        schedule_data["schedule_id"]
+    )
 
     return Schedule(**schedule_data)
 
@@ -882,14 +1339,15 @@ async def create_schedule(
 @api_router.get("/projects/{project_id}/schedules", response_model=List[Schedule])
 async def get_project_schedules(
     project_id: str,
+    view: ListView = "full",
     payload: dict = Depends(verify_token)
 ):
-    schedules = await db.schedules.find(
+    schedules = await db_read.schedules.find(
         {"project_id": project_id},
-        {"_id": 0}
+        projection(Schedule, view)
     ).sort("start_date", 1).to_list(1000)
 
-    return schedules
+    return trusted_response(schedules, Schedule, view)
 
 
 # ✅ UPDATE PROGRESS (Engineer)
@@ -897,6 +1355,7 @@ async def get_project_schedules(
 async def update_schedule_progress(
     schedule_id: str,
     progress: float,
+    background: BackgroundTasks,
     payload: dict = Depends(require_role(["Engineer"]))
 ):
     schedule = await db.schedules.find_one({"schedule_id": schedule_id})
@@ -918,10 +1377,11 @@ async def update_schedule_progress(
 
     # ✅ AUTO UPDATE PROJECT PROGRESS (Average)
     project_id = schedule["project_id"]
+    background.add_task(record_progress, db, project_id, schedule_id, progress, payload["user_id"])
 
     phases = await db.schedules.find(
         {"project_id": project_id},
-        {"_id": 0}
+        {"_id": 0, "progress": 1}
     ).to_list(100)
 
     if phases:
@@ -931,6 +1391,10 @@ async def update_schedule_progress(
             {"project_id": project_id},
             {"$set": {"progress": round(avg_progress, 2)}}
         )
+        await write_events.publish("projects", "update", project_id)
+        background.add_task(
+            record_progress, db, project_id, None, round(avg_progress, 2), payload["user_id"]
+        )
 
     return {"message": "Progress Updated ✅"}
 
@@ -955,6 +1419,14 @@ async def delete_project(
     await db.schedules.delete_many({"project_id": project_id})
     await db.materials.delete_many({"project_id": project_id})
     await db.drawings.delete_many({"project_id": project_id})
+    await remove_project(db, project_id)
+
+    # ✅ Covers the deleted drawings and materials too: same engineers and admins
+    await write_events.publish(
+        "projects", "delete", project_id,
+        assigned_engineers=project.get("assigned_engineers", []),
+        client_email=project.get("client_email")
+    )
 
     return {"message": "Project deleted successfully ✅"}
 
@@ -965,15 +1437,13 @@ async def delete_project(
     # ✅ NOTIFY ASSIGNED ENGINEERS
     # ============================
 
-    for engineer_id in project.get("assigned_engineers", []):
-
-        await create_notification(
-            engineer_id,
-            "schedule_update",
-            "New Schedule Phase Added",
-            f"Phase '{schedule.phase_name}' was added in project '{project['name']}'",
-            schedule_data["schedule_id"]
-        )
+    await notify_users(
+        project.get("assigned_engineers", []),
+        "schedule_update",
+        "New Schedule Phase Added",
+        f"Phase '{schedule.phase_name}' was added in project '{project['name']}'",
+        schedule_data["schedule_id"]
+    )
 
     # ============================
     # ✅ NOTIFY CLIENT ALSO
@@ -999,6 +1469,7 @@ async def delete_project(
 @api_router.get("/projects/{project_id}/schedules", response_model=List[Schedule])
 async def get_project_schedules(
     project_id: str,
+    view: ListView = "full",
     payload: dict = Depends(verify_token)
 ):
     # ✅ Admin can access only own project schedule
@@ -1009,20 +1480,123 @@ async def get_project_schedules(
         if not project:
             raise HTTPException(status_code=403, detail="Not allowed")
 
-    schedules = await db.schedules.find(
+    schedules = await db_read.schedules.find(
         {"project_id": project_id},
-        {"_id": 0}
+        projection(Schedule, view)
     ).to_list(1000)
 
-    return schedules
+    return trusted_response(schedules, Schedule, view)
+
+
+# Upper bound on chain steps; schedule lists are read 100 phases at a time.
+MAX_REFLOW_PASSES = 100
+
+# Read-modify-write attempts for a schedule update sent without If-Match.
+SCHEDULE_UPDATE_ATTEMPTS = 3
+
+async def reflow_phases(
+    project_id: str, schedule_id: str, old_end: str, new_end: str, holiday_dates: set
+) -> List[str]:
+    """Move the phases chained after a phase whose end date changed.
+
+    Phases are chained by create_schedule (each starts on the previous end
+    date), so only phases starting on ``old_end`` move, and the walk stops as
+    soon as an end date comes out unchanged. The edited phase and phases
+    already moved are never revisited, so a phase moved onto a date inside
+    its own chain cannot send the walk round in a loop.
+    """
+    moved = []
+    for _ in range(MAX_REFLOW_PASSES):
+        if old_end == new_end:
+            break
+        following = await db.schedules.find(
+            {"project_id": project_id, "start_date": old_end, "schedule_id": {"$nin": [schedule_id, *moved]}},
+            {"_id": 0, "schedule_id": 1, "duration": 1, "end_date": 1}
+        ).sort("schedule_id", 1).to_list(100)
+        following = [phase for phase in following if phase.get("duration")]
+        if not following:
+            break
+
+        ends = [add_working_days(new_end, phase["duration"], holiday_dates) for phase in following]
+        for phase, end_date in zip(following, ends):
+            await db.schedules.update_one(
+                {"schedule_id": phase["schedule_id"]},
+                {"$set": {"start_date": new_end, "end_date": end_date}, "$inc": {"version": 1}}
+            )
+            moved.append(phase["schedule_id"])
+
+        # create_schedule builds a single chain; follow it from the first phase
+        old_end, new_end = following[0]["end_date"], ends[0]
+    return moved
 
 
 @api_router.put("/schedules/{schedule_id}")
-async def update_schedule(schedule_id: str, updates: dict, payload: dict = Depends(require_role(["Admin"]))):
-    result = await db.schedules.update_one({"schedule_id": schedule_id}, {"$set": updates})
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Schedule not found")
-    return {"message": "Schedule updated successfully"}
+async def update_schedule(
+    schedule_id: str,
+    updates: ScheduleUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    payload: dict = Depends(require_role(["Admin"]))
+):
+    changes = updates.model_dump(exclude_unset=True)
+    if not changes:
+        raise HTTPException(status_code=400, detail="No fields to update")
+
+    expected = parse_if_match(if_match)
+    holiday_dates = None
+    # ✅ Without If-Match a lost race is retried on a fresh read (last writer
+    # wins, as for projects); with If-Match it is the client's conflict
+    for _ in range(SCHEDULE_UPDATE_ATTEMPTS):
+        schedule = await db.schedules.find_one({"schedule_id": schedule_id}, {"_id": 0})
+        if not schedule:
+            raise HTTPException(status_code=404, detail="Schedule not found")
+
+        version = schedule.get("version", 0)
+        if expected is not None and expected != version:
+            raise conflict(version)
+
+        # ✅ Only date changes recompute the end date (and the phases after it)
+        update = dict(changes)
+        if "start_date" in changes or "duration" in changes:
+            duration = changes.get("duration", schedule.get("duration"))
+            if not duration:
+                raise HTTPException(status_code=400, detail="Duration is required to reschedule this phase")
+            if holiday_dates is None:
+                holiday_dates = await load_holiday_dates()
+            update["end_date"] = add_working_days(
+                changes.get("start_date", schedule["start_date"]), duration, holiday_dates
+            )
+
+        # Conditional on the version read above, so the end date is computed
+        # from the document it is written to
+        updated = await db.schedules.find_one_and_update(
+            {"schedule_id": schedule_id, **version_filter(version)},
+            {"$set": update, "$inc": {"version": 1}},
+            projection={"_id": 0, "version": 1, "end_date": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated or expected is not None:
+            break
+
+    if not updated:
+        current = await db.schedules.find_one({"schedule_id": schedule_id}, {"_id": 0, "version": 1})
+        if not current:
+            raise HTTPException(status_code=404, detail="Schedule not found")
+        raise conflict(current.get("version"))
+
+    rescheduled = []
+    if holiday_dates is not None:
+        rescheduled = await reflow_phases(
+            schedule["project_id"], schedule_id, schedule["end_date"], updated["end_date"], holiday_dates
+        )
+
+    response.headers["ETag"] = etag(updated["version"])
+    return {
+        "message": "Schedule updated successfully",
+        "version": updated["version"],
+        "end_date": updated["end_date"],
+        "rescheduled": rescheduled,
+    }
 
 @api_router.delete("/schedules/{schedule_id}")
 async def delete_schedule(schedule_id: str, payload: dict = Depends(require_role(["Admin"]))):
@@ -1035,42 +1609,73 @@ async def delete_schedule(schedule_id: str, payload: dict = Depends(require_role
 # NOTIFICATION ROUTES
 # ====================
 
+async def list_notifications(user_id: str) -> list:
+    return await db.notifications.find(
+        {"user_id": user_id},
+        projection(Notification)
+    ).sort("created_at", -1).to_list(100)
+
+async def count_unread(user_id: str) -> int:
+    return await db.notifications.count_documents({"user_id": user_id, "read": False})
+
 @api_router.get("/notifications", response_model=List[Notification])
 async def get_notifications(payload: dict = Depends(verify_token)):
-    notifications = await db.notifications.find(
-        {"user_id": payload["user_id"]},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
-    return notifications
+    notifications = await list_notifications(payload["user_id"])
+    return trusted_response(notifications, Notification)
 
 @api_router.post("/notifications/{notification_id}/read")
 async def mark_notification_read(notification_id: str, payload: dict = Depends(verify_token)):
     result = await db.notifications.update_one(
         {"notification_id": notification_id, "user_id": payload["user_id"]},
-        {"$set": {"read": True}}
+        # read_at is a BSON date so the TTL index can expire read notifications
+        {"$set": {"read": True, "read_at": datetime.now(timezone.utc)}}
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Notification not found")
+    await write_events.publish("notifications", "update", notification_id, user_id=payload["user_id"])
     return {"message": "Notification marked as read"}
 
 @api_router.get("/notifications/unread/count")
 async def get_unread_count(payload: dict = Depends(verify_token)):
-    count = await db.notifications.count_documents({"user_id": payload["user_id"], "read": False})
+    count = await count_unread(payload["user_id"])
     return {"count": count}
 
+@api_router.get("/notifications/archive")
+async def get_notification_archive(month: Optional[str] = None, payload: dict = Depends(verify_token)):
+    """Archived notifications for one month (YYYY-MM), or the archived months when omitted."""
+    if month is None:
+        months = await db.notification_archive.find(
+            {"user_id": payload["user_id"]},
+            {"_id": 0, "month": 1, "count": 1}
+        ).sort("month", -1).to_list(120)
+        return months
+
+    bucket = await db.notification_archive.find_one(
+        {"user_id": payload["user_id"], "month": month},
+        {"_id": 0, "user_id": 0}
+    )
+    if not bucket:
+        raise HTTPException(status_code=404, detail="No archived notifications for this month")
+    bucket["notifications"].sort(key=lambda n: n["created_at"], reverse=True)
+    return bucket
+
 # ====================
 # DASHBOARD STATS
 # ====================
 
-@api_router.get("/stats/admin")
-async def get_admin_stats(payload: dict = Depends(require_role(["Admin"]))):
-    total_projects = await db.projects.count_documents({})
-    ongoing = await db.projects.count_documents({"status": "In Progress"})
-    completed = await db.projects.count_documents({"status": "Completed"})
-    engineers = await db.users.count_documents({"role": "Engineer"})
-    pending_drawings = await db.drawings.count_documents({"status": "Pending"})
-    pending_materials = await db.materials.count_documents({"status": "Pending"})
-    
+async def admin_stats(primary: bool = False) -> dict:
+    source = reader(primary)
+    (
+        total_projects, ongoing, completed, engineers, pending_drawings, pending_materials
+    ) = await asyncio.gather(
+        source.projects.count_documents({}),
+        source.projects.count_documents({"status": "In Progress"}),
+        source.projects.count_documents({"status": "Completed"}),
+        source.users.count_documents({"role": "Engineer"}),
+        source.drawings.count_documents({"status": "Pending"}),
+        source.materials.count_documents({"status": "Pending"}),
+    )
+
     return {
         "total_projects": total_projects,
         "ongoing_projects": ongoing,
@@ -1079,28 +1684,364 @@ async def get_admin_stats(payload: dict = Depends(require_role(["Admin"]))):
         "pending_approvals": pending_drawings + pending_materials
     }
 
-@api_router.get("/stats/engineer")
-async def get_engineer_stats(payload: dict = Depends(require_role(["Engineer"]))):
-    assigned_projects = await db.projects.count_documents({"assigned_engineers": payload["user_id"]})
-    pending_drawings = await db.drawings.count_documents({"engineer_id": payload["user_id"], "status": "Pending"})
-    approved_drawings = await db.drawings.count_documents({"engineer_id": payload["user_id"], "status": "Approved"})
-    
+async def engineer_stats(user_id: str, primary: bool = False) -> dict:
+    source = reader(primary)
+    assigned_projects, pending_drawings, approved_drawings = await asyncio.gather(
+        source.projects.count_documents({"assigned_engineers": user_id}),
+        source.drawings.count_documents({"engineer_id": user_id, "status": "Pending"}),
+        source.drawings.count_documents({"engineer_id": user_id, "status": "Approved"}),
+    )
+
     return {
         "assigned_projects": assigned_projects,
         "pending_drawings": pending_drawings,
         "approved_drawings": approved_drawings
     }
 
-app.include_router(api_router)
+@api_router.get("/stats/admin")
+async def get_admin_stats(payload: dict = Depends(require_role(["Admin"]))):
+    return await admin_stats()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@api_router.get("/stats/engineer")
+async def get_engineer_stats(payload: dict = Depends(require_role(["Engineer"]))):
+    return await engineer_stats(payload["user_id"])
+
+# ====================
+# WORKLOAD
+# ====================
+
+@api_router.get("/workload")
+async def get_workload(
+    engineer_id: Optional[str] = None,
+    payload: dict = Depends(require_role(["Admin", "Engineer"]))
+):
+    """Projects, active phases, pending drawings and pending materials per engineer.
+
+    Engineers get their own workload; admins get every engineer's, or one
+    with ``engineer_id``, limited to the projects they created.
+    """
+    project_ids = None
+    if payload["role"] == "Admin":
+        # ✅ Admin only own created projects (as in project_scope)
+        own = await db_read.projects.find(
+            {"created_by_admin": payload["user_id"]}, {"_id": 0, "project_id": 1}
+        ).to_list(1000)
+        project_ids = [p["project_id"] for p in own]
+
+    if payload["role"] == "Engineer":
+        engineer_ids = [payload["user_id"]]
+    elif engineer_id:
+        engineer_ids = [engineer_id]
+    else:
+        engineers = await db_read.users.find(
+            {"role": "Engineer"}, {"_id": 0, "user_id": 1}
+        ).to_list(1000)
+        engineer_ids = [engineer["user_id"] for engineer in engineers]
+
+    return ORJSONResponse(await workload(db_read, engineer_ids, project_ids))
+
+# ====================
+# DASHBOARD
+# ====================
+
+async def no_stats():
+    return None
+
+@api_router.get("/dashboard")
+async def get_dashboard(payload: dict = Depends(verify_token)):
+    """Everything the dashboard shell needs in one round trip.
+
+    Combines /auth/me, the role's stats, /projects, /notifications and the
+    unread count. The user is resolved once and the remaining queries run
+    concurrently; the payload is cached per user for DASHBOARD_CACHE_SECONDS.
+    """
+    user_id = payload["user_id"]
+    cached = dashboard_cache.get(user_id)
+    if cached is not None:
+        return ORJSONResponse(cached)
+
+    # ✅ Primary reads: the result is cached, so a lagging secondary would
+    # serve stale data until the next invalidation
+    user = await db.users.find_one({"user_id": user_id}, {"_id": 0, "password_hash": 0})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if payload["role"] == "Admin":
+        stats = admin_stats(primary=True)
+    elif payload["role"] == "Engineer":
+        stats = engineer_stats(user_id, primary=True)
+    else:
+        stats = no_stats()
+
+    stats, projects, notifications, unread = await asyncio.gather(
+        stats,
+        list_projects(payload, user=user, primary=True),
+        list_notifications(user_id),
+        count_unread(user_id),
+    )
+
+    dashboard = {
+        "user": user,
+        "stats": stats,
+        "projects": projects,
+        "notifications": notifications,
+        "unread_count": unread,
+    }
+    dashboard_cache.set(user_id, dashboard)
+    return ORJSONResponse(dashboard)
+
+# ====================
+# SEARCH
+# ====================
+
+@api_router.get("/search")
+async def search_records(
+    q: str = Query(..., min_length=2, max_length=100),
+    types: str = "projects,drawings,materials",
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    payload: dict = Depends(verify_token)
+):
+    wanted = [t.strip() for t in types.split(",") if t.strip()]
+    unknown = [t for t in wanted if t not in SEARCH_TARGETS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search types: {', '.join(unknown)}")
+    if page * limit > MAX_SEARCH_WINDOW:
+        raise HTTPException(status_code=400, detail=f"Search results are limited to the first {MAX_SEARCH_WINDOW}")
+
+    # ✅ Same role filtering as the list routes
+    scopes = {}
+    if "projects" in wanted:
+        scopes["projects"] = await project_scope(payload)
+    if "drawings" in wanted:
+        scopes["drawings"] = drawing_scope(payload)
+    if "materials" in wanted:
+        scopes["materials"] = await material_scope(payload)
+
+    return await search(db_read, q, scopes, page, limit)
+
+# ====================
+# EXPORT
+# ====================
+
+async def schedule_scope(payload: dict, project_id: Optional[str] = None) -> dict:
+    """Mongo filter for the schedule phases of projects the caller can see."""
+    visible = await db_read.projects.find(
+        await project_scope(payload),
+        {"_id": 0, "project_id": 1}
+    ).to_list(None)
+    project_ids = [p["project_id"] for p in visible]
+
+    if project_id:
+        if project_id not in project_ids:
+            raise HTTPException(status_code=403, detail="Not allowed")
+        return {"project_id": project_id}
+    return {"project_id": {"$in": project_ids}}
+
+def find_export(collection: str, columns: List[str], scope, sort_field: str):
+    async def open_cursor(payload: dict, project_id: Optional[str]):
+        query = await scope(payload, project_id)
+        return db_read[collection].find(
+            query,
+            {"_id": 0, **{column: 1 for column in columns}}
+        ).sort(sort_field, 1)
+    return columns, open_cursor
+
+async def export_drawing_scope(payload: dict, project_id: Optional[str] = None) -> dict:
+    return drawing_scope(payload, project_id)
+
+async def open_progress_cursor(payload: dict, project_id: Optional[str]):
+    query = await schedule_scope(payload, project_id)
+    return db_read.progress_history.aggregate(history_pipeline(query["project_id"]))
+
+# dataset -> (columns, cursor factory)
+EXPORT_DATASETS = {
+    "materials": find_export("materials", list(Material.model_fields), material_scope, "created_at"),
+    "schedules": find_export("schedules", list(Schedule.model_fields), schedule_scope, "start_date"),
+    "drawings": find_export("drawings", list(DrawingResponse.model_fields), export_drawing_scope, "upload_date"),
+    "progress": (HISTORY_COLUMNS, open_progress_cursor),
+}
+
+@api_router.get("/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = "csv",
+    project_id: Optional[str] = None,
+    payload: dict = Depends(verify_token)
+):
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=404, detail="Unknown export dataset")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format must be csv or ndjson")
+
+    columns, open_cursor = EXPORT_DATASETS[dataset]
+    cursor = await open_cursor(payload, project_id)
+
+    filename = f"{dataset}-{datetime.now(timezone.utc).strftime('%Y%m%d')}.{format}"
+    return StreamingResponse(
+        stream_export(cursor, format, columns, settings.export_batch_size),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+# ====================
+# METRICS
+# ====================
+
+async def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+# ====================
+# APP
+# ====================
+
+rate_limit_store = InMemoryBucketStore()
+background_tasks = []
+
+def connect_db():
+    global client, db, db_read, fs
+    if not settings.mongo_url or not settings.db_name:
+        raise RuntimeError("MONGO_URL and DB_NAME must be set")
+    listeners = [MongoCommandMetrics(settings.slow_query_ms), MongoPoolMetrics(settings.pool_size)]
+    # Per-request query logs feed both the query budget and trace capture
+    if settings.query_budget_enabled or settings.trace_capture_enabled:
+        listeners.append(QueryBudgetListener())
+    client = AsyncIOMotorClient(
+        settings.mongo_url, event_listeners=listeners, **settings.client_options()
+    )
+    db = client[settings.db_name]
+    if settings.mongo_read_secondary:
+        db_read = client.get_database(
+            settings.db_name,
+            read_preference=SecondaryPreferred(max_staleness=settings.mongo_max_staleness_seconds)
+        )
+    else:
+        db_read = db
+    fs = AsyncIOMotorGridFSBucket(db)
+
+async def start_background_tasks():
+    await ensure_notification_indexes(db, settings.notification_read_ttl_days)
+    await ensure_search_indexes(db)
+    await ensure_progress_collections(db)
+    await ensure_idempotency_indexes(db.idempotency_keys, settings.idempotency_ttl_hours)
+    await ensure_membership_indexes(db)
+    await ensure_upload_indexes(db)
+    if isinstance(rate_limit_store, MongoBucketStore):
+        await rate_limit_store.ensure_indexes()
+    background_tasks.append(asyncio.create_task(run_archiver(
+        db, settings.notification_archive_interval, settings.notification_archive_days
+    )))
+    background_tasks.append(asyncio.create_task(run_upload_collector(
+        db, settings.upload_gc_interval, settings.upload_session_hours, settings.upload_complete_timeout_seconds
+    )))
+    background_tasks.append(asyncio.create_task(loop_lag_monitor.run()))
+    background_tasks.append(asyncio.create_task(invalidation_broker.start(db)))
+    if settings.change_stream_events:
+        background_tasks.append(asyncio.create_task(write_events.watch(db)))
 
-@app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    client.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    connect_db()
+    try:
+        await start_background_tasks()
+        yield
+    finally:
+        await shutdown_db_client()
+
+def configure(new_settings: Settings):
+    """Apply settings to the module-level state the route handlers use."""
+    global settings, JWT_SECRET, rate_limit_store, _resend
+    settings = new_settings
+    JWT_SECRET = settings.jwt_secret
+    _resend = None
+    dashboard_cache.ttl = settings.dashboard_cache_seconds
+    holiday_cache.ttl = settings.holiday_cache_seconds
+    invalidation_broker.distributed = settings.web_concurrency > 1
+    # RATE_LIMIT_STORE=mongo shares buckets between processes
+    if settings.rate_limit_store == "mongo":
+        rate_limit_store = MongoBucketStore(lambda: db.rate_limits)
+    else:
+        rate_limit_store = InMemoryBucketStore()
+
+def create_app(app_settings: Optional[Settings] = None) -> FastAPI:
+    """Build the ASGI app; run.py calls this once per worker process.
+
+    Nothing connects until the app's lifespan starts, so building an app
+    (e.g. in tests) needs neither a database nor MONGO_URL/DB_NAME.
+    """
+    configure(app_settings or Settings.from_env())
+    app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+    app.add_api_route(
+        "/metrics", get_metrics, methods=["GET"],
+        response_class=PlainTextResponse, include_in_schema=False
+    )
+    app.include_router(api_router)
+
+    app.add_middleware(
+        IdempotencyMiddleware,
+        get_collection=lambda: db.idempotency_keys,
+        identify=caller_id,
+        lease_seconds=settings.idempotency_lease_seconds,
+    )
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=settings.cors_origins,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_min_size,
+        gzip_level=settings.gzip_level,
+        brotli_quality=settings.brotli_quality,
+    )
+
+    if settings.query_budget_enabled:
+        app.add_middleware(
+            QueryBudgetMiddleware,
+            mode=settings.query_budget_mode.lower(),
+            budget=settings.query_budget,
+            route_budgets=parse_route_budgets(settings.query_budget_routes),
+            repeat_threshold=settings.query_repeat_threshold,
+        )
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        identify=caller_id,
+        store=rate_limit_store,
+        limits=parse_rate_limits(settings.rate_limits),
+        max_in_flight=settings.max_in_flight,
+        max_loop_lag_ms=settings.max_loop_lag_ms,
+        trust_forwarded=settings.rate_limit_trust_forwarded,
+    )
+
+    # TRACE_CAPTURE_FILE records anonymized traces for benchmarks/replay.py
+    if settings.trace_capture_enabled:
+        app.add_middleware(
+            TraceCaptureMiddleware,
+            identify=caller_payload,
+            path=settings.trace_capture_file,
+            sample_rate=settings.trace_sample_rate,
+        )
+
+    app.add_middleware(MetricsMiddleware)
+    return app
+
+def __getattr__(name):
+    # 'uvicorn server:app' keeps working, but importing server no longer
+    # builds an app as a side effect.
+    if name == "app":
+        app = create_app()
+        globals()["app"] = app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
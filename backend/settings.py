@@ -0,0 +1,174 @@
+"""Runtime configuration for the API, read from the environment and ``.env``."""
+
+import os
+from pathlib import Path
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+ROOT_DIR = Path(__file__).parent
+
+
+class Settings(BaseModel):
+    mongo_url: Optional[str] = None
+    db_name: Optional[str] = None
+
+    jwt_secret: str = "your-secret-key"
+
+    # Email is disabled (and resend never imported) without an API key
+    resend_api_key: Optional[str] = None
+    sender_email: str = "onboarding@resend.dev"
+
+    cors_origins: List[str] = ["*"]
+
+    # Worker processes and the Mongo connections shared between them
+    web_concurrency: int = 1
+    mongo_pool_budget: int = 100
+    mongo_max_pool_size: Optional[int] = None
+    mongo_min_pool_size: int = 0
+    mongo_max_idle_time_ms: Optional[int] = None
+    mongo_wait_queue_timeout_ms: Optional[int] = None
+    mongo_server_selection_timeout_ms: int = 10000
+    mongo_connect_timeout_ms: int = 10000
+    # Wire compression, e.g. "zstd,snappy,zlib" (zstd/snappy need their packages)
+    mongo_compressors: Optional[str] = None
+
+    # Route read-only endpoints to secondaries when a replica set has them.
+    # Mongo requires max staleness of at least 90 seconds.
+    mongo_read_secondary: bool = False
+    mongo_max_staleness_seconds: int = 90
+
+    dashboard_cache_seconds: float = 5.0
+    # Invalidated by holiday writes, so it can be long-lived
+    holiday_cache_seconds: float = 3600.0
+    # Also invalidate caches for writes made outside the app (replica sets only)
+    change_stream_events: bool = False
+
+    # Overload shedding and token buckets; rate_limits overrides the
+    # per-class defaults as "auth=10/60,poll=60/60" (capacity/seconds)
+    rate_limit_store: str = "memory"
+    rate_limits: str = ""
+    rate_limit_trust_forwarded: bool = False
+    max_in_flight: int = 200
+    max_loop_lag_ms: float = 500.0
+
+    compression_min_size: int = 1024
+    gzip_level: int = 6
+    brotli_quality: int = 4
+
+    notification_read_ttl_days: int = 14
+    notification_archive_days: int = 30
+    notification_archive_interval: int = 3600
+
+    upload_chunk_size: int = 1024 * 1024
+    upload_max_size: int = 500 * 1024 * 1024
+    # Largest body accepted by one PUT, in chunks
+    upload_max_put_chunks: int = 8
+    upload_session_hours: int = 24
+    upload_gc_interval: int = 3600
+    # A session still completing after this long was abandoned by its worker
+    upload_complete_timeout_seconds: int = 300
+
+    idempotency_ttl_hours: int = 24
+    idempotency_lease_seconds: int = 300
+    export_batch_size: int = 500
+
+    # Diagnostics: slow query log, per-request query budget ("off", "warn",
+    # "fail") and anonymized trace capture for benchmarks/replay.py
+    slow_query_ms: float = 100.0
+    query_budget_mode: str = "off"
+    query_budget: int = 25
+    query_budget_routes: str = ""
+    query_repeat_threshold: int = 5
+    trace_capture_file: Optional[str] = None
+    trace_sample_rate: float = 1.0
+
+    @property
+    def pool_size(self) -> int:
+        if self.mongo_max_pool_size:
+            return self.mongo_max_pool_size
+        return max(10, self.mongo_pool_budget // self.web_concurrency)
+
+    def client_options(self) -> dict:
+        """Keyword arguments for AsyncIOMotorClient."""
+        options = {
+            "maxPoolSize": self.pool_size,
+            "minPoolSize": self.mongo_min_pool_size,
+            "serverSelectionTimeoutMS": self.mongo_server_selection_timeout_ms,
+            "connectTimeoutMS": self.mongo_connect_timeout_ms,
+        }
+        if self.mongo_max_idle_time_ms is not None:
+            options["maxIdleTimeMS"] = self.mongo_max_idle_time_ms
+        if self.mongo_wait_queue_timeout_ms is not None:
+            options["waitQueueTimeoutMS"] = self.mongo_wait_queue_timeout_ms
+        if self.mongo_compressors:
+            options["compressors"] = self.mongo_compressors
+        return options
+
+    @property
+    def email_enabled(self) -> bool:
+        return bool(self.resend_api_key)
+
+    @property
+    def query_budget_enabled(self) -> bool:
+        return self.query_budget_mode.lower() in ("warn", "fail")
+
+    @property
+    def trace_capture_enabled(self) -> bool:
+        return bool(self.trace_capture_file)
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        load_dotenv(ROOT_DIR / '.env')
+        env = os.environ
+        values = {
+            "mongo_url": env.get('MONGO_URL'),
+            "db_name": env.get('DB_NAME'),
+            "jwt_secret": env.get('JWT_SECRET'),
+            "resend_api_key": env.get('RESEND_API_KEY'),
+            "sender_email": env.get('SENDER_EMAIL'),
+            "cors_origins": env['CORS_ORIGINS'].split(',') if 'CORS_ORIGINS' in env else None,
+            "web_concurrency": env.get('WEB_CONCURRENCY'),
+            "mongo_pool_budget": env.get('MONGO_POOL_BUDGET'),
+            "mongo_max_pool_size": env.get('MONGO_MAX_POOL_SIZE'),
+            "mongo_min_pool_size": env.get('MONGO_MIN_POOL_SIZE'),
+            "mongo_max_idle_time_ms": env.get('MONGO_MAX_IDLE_TIME_MS'),
+            "mongo_wait_queue_timeout_ms": env.get('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+            "mongo_server_selection_timeout_ms": env.get('MONGO_SERVER_SELECTION_TIMEOUT_MS'),
+            "mongo_connect_timeout_ms": env.get('MONGO_CONNECT_TIMEOUT_MS'),
+            "mongo_compressors": env.get('MONGO_COMPRESSORS'),
+            "mongo_read_secondary": env.get('MONGO_READ_SECONDARY'),
+            "mongo_max_staleness_seconds": env.get('MONGO_MAX_STALENESS_SECONDS'),
+            "dashboard_cache_seconds": env.get('DASHBOARD_CACHE_SECONDS'),
+            "holiday_cache_seconds": env.get('HOLIDAY_CACHE_SECONDS'),
+            "change_stream_events": env.get('CHANGE_STREAM_EVENTS'),
+            "rate_limit_store": env.get('RATE_LIMIT_STORE'),
+            "rate_limits": env.get('RATE_LIMITS'),
+            "rate_limit_trust_forwarded": env.get('RATE_LIMIT_TRUST_FORWARDED'),
+            "max_in_flight": env.get('MAX_IN_FLIGHT'),
+            "max_loop_lag_ms": env.get('MAX_LOOP_LAG_MS'),
+            "compression_min_size": env.get('COMPRESSION_MIN_SIZE'),
+            "gzip_level": env.get('GZIP_LEVEL'),
+            "brotli_quality": env.get('BROTLI_QUALITY'),
+            "notification_read_ttl_days": env.get('NOTIFICATION_READ_TTL_DAYS'),
+            "notification_archive_days": env.get('NOTIFICATION_ARCHIVE_DAYS'),
+            "notification_archive_interval": env.get('NOTIFICATION_ARCHIVE_INTERVAL'),
+            "upload_chunk_size": env.get('UPLOAD_CHUNK_SIZE'),
+            "upload_max_size": env.get('UPLOAD_MAX_SIZE'),
+            "upload_max_put_chunks": env.get('UPLOAD_MAX_PUT_CHUNKS'),
+            "upload_session_hours": env.get('UPLOAD_SESSION_HOURS'),
+            "upload_gc_interval": env.get('UPLOAD_GC_INTERVAL'),
+            "upload_complete_timeout_seconds": env.get('UPLOAD_COMPLETE_TIMEOUT_SECONDS'),
+            "idempotency_ttl_hours": env.get('IDEMPOTENCY_TTL_HOURS'),
+            "idempotency_lease_seconds": env.get('IDEMPOTENCY_LEASE_SECONDS'),
+            "export_batch_size": env.get('EXPORT_BATCH_SIZE'),
+            "slow_query_ms": env.get('SLOW_QUERY_MS'),
+            "query_budget_mode": env.get('QUERY_BUDGET_MODE'),
+            "query_budget": env.get('QUERY_BUDGET'),
+            "query_budget_routes": env.get('QUERY_BUDGET_ROUTES'),
+            "query_repeat_threshold": env.get('QUERY_REPEAT_THRESHOLD'),
+            "trace_capture_file": env.get('TRACE_CAPTURE_FILE'),
+            "trace_sample_rate": env.get('TRACE_SAMPLE_RATE'),
+        }
+        return cls(**{key: value for key, value in values.items() if value is not None})
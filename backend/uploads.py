@@ -0,0 +1,245 @@
+"""Resumable, chunked drawing uploads written straight into GridFS.
+
+Protocol:
+
+1. ``POST /api/drawings/uploads`` opens a session for a file of known size
+   and returns the ``upload_id`` and ``chunk_size``.
+2. ``PUT /api/drawings/uploads/{upload_id}?offset=N`` sends raw bytes starting
+   at ``offset``. Offsets must fall on chunk boundaries and every chunk but the
+   last must be full, so each chunk maps to exactly one GridFS chunk document
+   (``files_id``, ``n``). Chunks are upserted, so repeating a PUT after a
+   dropped connection, or sending chunks out of order, is harmless.
+3. ``GET /api/drawings/uploads/{upload_id}`` lists the chunks still missing.
+4. ``POST /api/drawings/uploads/{upload_id}/complete`` checks that every chunk
+   is present and writes the ``fs.files`` document, which makes the file
+   visible to GridFS readers. The session is ``completing`` while that runs;
+   if completing fails it goes back to ``open`` so the client can retry.
+   A session left ``completing`` for ``UPLOAD_COMPLETE_TIMEOUT_SECONDS`` (the
+   worker died mid-way) can be completed again, or is reopened by the
+   collector; if its drawing was already stored it is closed against it.
+
+Open sessions not completed within ``UPLOAD_SESSION_HOURS`` of their last
+chunk are collected together with their chunks, by whichever worker holds
+the ``upload_collector`` lease.
+"""
+
+import asyncio
+import logging
+import math
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from leases import acquire_lease
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_CONTENT_TYPES = ("application/pdf", "image/jpeg", "image/jpg", "image/png")
+
+
+async def ensure_upload_indexes(db):
+    await db.upload_sessions.create_index("upload_id", unique=True)
+    await db.upload_sessions.create_index("expires_at")
+    # Same spec GridFS creates itself; makes the chunk upsert key unique.
+    await db["fs.chunks"].create_index([("files_id", ASCENDING), ("n", ASCENDING)], unique=True)
+
+
+def chunk_count(size: int, chunk_size: int) -> int:
+    return max(1, math.ceil(size / chunk_size))
+
+
+async def open_session(db, engineer_id: str, project_id: str, filename: str, content_type: str, size: int,
+                       chunk_size: int, max_size: int, session_hours: int) -> dict:
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="Only PDF and JPG files allowed")
+    if size <= 0 or size > max_size:
+        raise HTTPException(status_code=400, detail=f"File size must be between 1 and {max_size} bytes")
+
+    now = datetime.now(timezone.utc)
+    session = {
+        "upload_id": str(ObjectId()),
+        "file_id": ObjectId(),
+        "engineer_id": engineer_id,
+        "project_id": project_id,
+        "filename": filename,
+        "content_type": content_type,
+        "size": size,
+        "chunk_size": chunk_size,
+        "status": "open",
+        "created_at": now.isoformat(),
+        "expires_at": now + timedelta(hours=session_hours),
+    }
+    await db.upload_sessions.insert_one(session)
+    return session
+
+
+async def get_session(db, upload_id: str, engineer_id: str) -> dict:
+    session = await db.upload_sessions.find_one({"upload_id": upload_id}, {"_id": 0})
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if session["engineer_id"] != engineer_id:
+        raise HTTPException(status_code=403, detail="Not Allowed")
+    return session
+
+
+async def write_chunks(db, session: dict, offset: int, body: bytes, session_hours: int) -> int:
+    """Store ``body`` at ``offset``; returns the number of chunks written."""
+    if session["status"] != "open":
+        raise HTTPException(status_code=409, detail="Upload already completed")
+
+    size, chunk_size = session["size"], session["chunk_size"]
+    if offset < 0 or offset % chunk_size or offset >= size:
+        raise HTTPException(status_code=400, detail=f"Offset must be a multiple of {chunk_size} below {size}")
+    end = offset + len(body)
+    if not body or end > size or (end < size and len(body) % chunk_size):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Body must be whole {chunk_size}-byte chunks, or run exactly to the end of the file"
+        )
+
+    first = offset // chunk_size
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    await db["fs.chunks"].bulk_write([
+        UpdateOne(
+            {"files_id": session["file_id"], "n": first + i},
+            {"$set": {"data": data}},
+            upsert=True,
+        )
+        for i, data in enumerate(chunks)
+    ], ordered=False)
+    await db.upload_sessions.update_one(
+        {"upload_id": session["upload_id"]},
+        {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(hours=session_hours)}}
+    )
+    return len(chunks)
+
+
+async def missing_chunks(db, session: dict) -> list:
+    present = await db["fs.chunks"].distinct("n", {"files_id": session["file_id"]})
+    return sorted(set(range(chunk_count(session["size"], session["chunk_size"]))) - set(present))
+
+
+def _stalled(complete_timeout: int) -> dict:
+    """Sessions a dead worker left ``completing``."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=complete_timeout)
+    return {"status": "completing", "completing_since": {"$lt": cutoff}}
+
+
+async def finalize(db, session: dict, session_hours: int, complete_timeout: int) -> ObjectId:
+    """Write the GridFS files document once every chunk is stored."""
+    missing = await missing_chunks(db, session)
+    if missing:
+        raise HTTPException(status_code=409, detail={"message": "Upload incomplete", "missing": missing[:100]})
+
+    claimed = await db.upload_sessions.update_one(
+        {"upload_id": session["upload_id"], "$or": [{"status": "open"}, _stalled(complete_timeout)]},
+        {"$set": {"status": "completing", "completing_since": datetime.now(timezone.utc)}}
+    )
+    if claimed.modified_count == 0:
+        raise HTTPException(
+            status_code=409, detail="Upload is being completed; retry shortly", headers={"Retry-After": "1"}
+        )
+
+    try:
+        await db["fs.files"].insert_one({
+            "_id": session["file_id"],
+            "length": session["size"],
+            "chunkSize": session["chunk_size"],
+            "uploadDate": datetime.now(timezone.utc),
+            "filename": session["filename"],
+            "metadata": {"content_type": session["content_type"]},
+        })
+    except DuplicateKeyError:
+        pass  # written by an earlier attempt that did not get to create the drawing
+    except Exception:
+        await release_session(db, session, session_hours)
+        raise
+    return session["file_id"]
+
+
+async def release_session(db, session: dict, session_hours: int, completing_since: Optional[datetime] = None):
+    """Undo a failed ``finalize``: reopen the session for another attempt.
+
+    A files document already written stays; the next attempt reuses it, and
+    the collector deletes it with the chunks if the session expires. With
+    ``completing_since``, only a claim made at that time is released, so a
+    completion that re-claimed the session in the meantime is left alone.
+    """
+    query = {"upload_id": session["upload_id"], "status": "completing"}
+    if completing_since is not None:
+        query["completing_since"] = completing_since
+    await db.upload_sessions.update_one(
+        query,
+        {
+            "$set": {
+                "status": "open",
+                "expires_at": datetime.now(timezone.utc) + timedelta(hours=session_hours),
+            },
+            "$unset": {"completing_since": ""},
+        }
+    )
+
+
+async def close_session(db, upload_id: str, drawing_id: str):
+    await db.upload_sessions.update_one(
+        {"upload_id": upload_id},
+        {
+            "$set": {"status": "completed", "drawing_id": drawing_id},
+            "$unset": {"expires_at": "", "completing_since": ""},
+        }
+    )
+
+
+async def recover_session(db, session: dict, session_hours: int,
+                          completing_since: Optional[datetime] = None) -> Optional[str]:
+    """Settle a ``completing`` session: close it if its drawing exists, else reopen it.
+
+    Returns the drawing id when the session was closed.
+    """
+    drawing = await db.drawings.find_one({"file_id": str(session["file_id"])}, {"_id": 0, "drawing_id": 1})
+    if drawing:
+        await close_session(db, session["upload_id"], drawing["drawing_id"])
+        return drawing["drawing_id"]
+    await release_session(db, session, session_hours, completing_since)
+    return None
+
+
+async def collect_abandoned(db, session_hours: int, complete_timeout: int) -> int:
+    """Settle stalled completions, then delete expired open sessions and their chunks.
+
+    Sessions being completed are never deleted: their file may already be
+    referenced by a drawing.
+    """
+    async for session in db.upload_sessions.find(_stalled(complete_timeout), {"_id": 0}):
+        await recover_session(db, session, session_hours, session["completing_since"])
+
+    now = datetime.now(timezone.utc)
+    collected = 0
+    async for session in db.upload_sessions.find(
+        {"expires_at": {"$lt": now}, "status": "open"},
+        {"_id": 0, "upload_id": 1, "file_id": 1}
+    ):
+        await db["fs.files"].delete_one({"_id": session["file_id"]})
+        await db["fs.chunks"].delete_many({"files_id": session["file_id"]})
+        await db.upload_sessions.delete_one({"upload_id": session["upload_id"]})
+        collected += 1
+    return collected
+
+
+async def run_upload_collector(db, interval: int, session_hours: int, complete_timeout: int):
+    while True:
+        try:
+            collected = 0
+            if await acquire_lease(db, "upload_collector", interval * 2):
+                collected = await collect_abandoned(db, session_hours, complete_timeout)
+            if collected:
+                logger.info(f"Collected {collected} abandoned uploads")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Upload collection failed: {str(e)}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,134 @@
+"""Shared fixtures: backend import path, query budget and an in-memory Mongo stand-in."""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+# Backend modules are flat (``import server``), like under ``cd backend``.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--query-budget-mode", default="fail", choices=("off", "warn", "fail"),
+        help="QUERY_BUDGET_MODE for apps built during the test run (default: fail)",
+    )
+
+
+def pytest_configure(config):
+    # Apps created from Settings.from_env() in tests answer an over-budget
+    # request with a 500, so a route regressing into per-item queries fails.
+    os.environ.setdefault("QUERY_BUDGET_MODE", config.getoption("--query-budget-mode"))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+# ====================
+# IN-MEMORY MONGO
+# ====================
+
+def _matches(document: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        value = document.get(field)
+        if not isinstance(condition, dict):
+            if value != condition and not (isinstance(value, list) and condition in value):
+                return False
+            continue
+        for op, operand in condition.items():
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$nin" and value in operand:
+                return False
+            if op == "$lt" and not (value is not None and value < operand):
+                return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, documents: list):
+        self.documents = documents
+
+    def sort(self, field: str, direction: int = 1):
+        self.documents.sort(key=lambda d: d.get(field), reverse=direction < 0)
+        return self
+
+    async def to_list(self, length: int):
+        return self.documents[:length]
+
+
+class FakeCollection:
+    """The subset of a Motor collection the tested modules use."""
+
+    def __init__(self):
+        self.documents = []
+        self.bulk_writes = []
+
+    @staticmethod
+    def _project(document: dict, projection: dict = None) -> dict:
+        if not projection:
+            return dict(document)
+        return {k: v for k, v in document.items() if projection.get(k)}
+
+    def _find(self, query: dict) -> list:
+        return [d for d in self.documents if _matches(d, query)]
+
+    async def insert_one(self, document: dict):
+        if "_id" in document and any(d.get("_id") == document["_id"] for d in self.documents):
+            raise DuplicateKeyError("duplicate key", 11000)
+        self.documents.append(dict(document))
+
+    async def find_one(self, query: dict, projection: dict = None):
+        found = self._find(query)
+        return self._project(found[0], projection) if found else None
+
+    def find(self, query: dict, projection: dict = None):
+        return FakeCursor([self._project(d, projection) for d in self._find(query)])
+
+    async def update_one(self, query: dict, update: dict):
+        found = self._find(query)
+        if found:
+            document = found[0]
+            document.update(update.get("$set", {}))
+            for field, amount in update.get("$inc", {}).items():
+                document[field] = document.get(field, 0) + amount
+            for field in update.get("$unset", {}):
+                document.pop(field, None)
+        return found[0] if found else None
+
+    async def find_one_and_update(self, query: dict, update: dict):
+        found = self._find(query)
+        before = dict(found[0]) if found else None
+        await self.update_one(query, update)
+        return before
+
+    async def delete_one(self, query: dict):
+        found = self._find(query)
+        if found:
+            self.documents.remove(found[0])
+
+    async def bulk_write(self, requests: list, ordered: bool = True):
+        self.bulk_writes.append(requests)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return self._collections.setdefault(name, FakeCollection())
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+@pytest.fixture
+def fake_db():
+    return FakeDatabase()
@@ -0,0 +1,33 @@
+import pytest
+
+import compression
+from compression import negotiate_encoding
+
+
+@pytest.fixture
+def with_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "_brotli", object())
+
+
+@pytest.fixture
+def without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "_brotli", False)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("br;q=0.5, gzip;q=1.0", "gzip"),
+    ("gzip;q=0.4, br;q=0.9", "br"),
+    ("gzip, br", "br"),
+    ("br;q=0, *;q=0.3", "gzip"),
+    ("*", "br"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("", None),
+])
+def test_highest_quality_wins(with_brotli, header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+def test_gzip_without_brotli(without_brotli):
+    assert negotiate_encoding("br, gzip;q=0.1") == "gzip"
+    assert negotiate_encoding("br") is None
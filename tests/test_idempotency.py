@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import pytest
+
+from idempotency import IdempotencyMiddleware
+
+
+class CountingApp:
+    """Creates a record per call; ``gate`` holds calls until it is set."""
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = None
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        if self.gate is not None:
+            await self.gate.wait()
+        payload = json.dumps({"record": self.calls, "received": body.decode()}).encode()
+        await send({"type": "http.response.start", "status": 201,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": payload})
+
+
+async def post(app, body: bytes, key: str = "key-1"):
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/api/materials",
+        "headers": [(b"idempotency-key", key.encode()), (b"content-type", b"application/json")],
+    }
+    messages = [{"type": "http.request", "body": body[:3], "more_body": True},
+                {"type": "http.request", "body": body[3:], "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start, body_message = sent
+    return start["status"], dict(start["headers"]), body_message["body"]
+
+
+@pytest.fixture
+def route():
+    return CountingApp()
+
+
+@pytest.fixture
+def middleware(route, fake_db):
+    return IdempotencyMiddleware(route, lambda: fake_db.idempotency_keys, lambda scope: "user-1")
+
+
+@pytest.mark.anyio
+async def test_retry_replays_the_stored_response(middleware, route):
+    first = await post(middleware, b'{"name": "cement"}')
+    retry = await post(middleware, b'{"name": "cement"}')
+
+    assert route.calls == 1
+    assert retry[0] == first[0] == 201
+    assert retry[2] == first[2]
+    assert retry[1][b"idempotent-replayed"] == b"true"
+    assert b"idempotent-replayed" not in first[1]
+
+
+@pytest.mark.anyio
+async def test_new_key_runs_the_route_again(middleware, route):
+    await post(middleware, b'{"name": "cement"}', key="key-1")
+    await post(middleware, b'{"name": "cement"}', key="key-2")
+
+    assert route.calls == 2
+
+
+@pytest.mark.anyio
+async def test_same_key_with_another_body_is_rejected(middleware, route):
+    await post(middleware, b'{"name": "cement"}')
+    status, _, body = await post(middleware, b'{"name": "steel"}')
+
+    assert status == 422
+    assert b"different request body" in body
+    assert route.calls == 1
+
+
+@pytest.mark.anyio
+async def test_retry_during_the_first_attempt_conflicts(middleware, route):
+    route.gate = asyncio.Event()
+    first = asyncio.create_task(post(middleware, b'{"name": "cement"}'))
+    await asyncio.sleep(0)
+
+    status, headers, _ = await post(middleware, b'{"name": "cement"}')
+    route.gate.set()
+    await first
+
+    assert status == 409
+    assert headers[b"retry-after"] == b"1"
+    assert route.calls == 1
+
+
+@pytest.mark.anyio
+async def test_abandoned_claim_is_taken_over(route, fake_db):
+    middleware = IdempotencyMiddleware(
+        route, lambda: fake_db.idempotency_keys, lambda scope: "user-1", lease_seconds=0
+    )
+    route.gate = asyncio.Event()
+    first = asyncio.create_task(post(middleware, b'{"name": "cement"}'))
+    await asyncio.sleep(0.01)
+    route.gate.set()
+
+    status, _, _ = await post(middleware, b'{"name": "cement"}')
+    await first
+
+    assert status == 201
+    assert route.calls == 2
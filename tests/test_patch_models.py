@@ -0,0 +1,40 @@
+import pytest
+from pydantic import ValidationError
+
+from server import ProjectUpdate, ScheduleUpdate
+
+
+def test_only_sent_fields_are_dumped():
+    update = ProjectUpdate(name="Tower B", budget=1200000)
+    assert update.model_dump(exclude_unset=True) == {"name": "Tower B", "budget": 1200000}
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(ValidationError):
+        ProjectUpdate(name="Tower B", created_by_admin="someone-else")
+
+
+def test_nulls_are_rejected_unless_nullable():
+    with pytest.raises(ValidationError):
+        ProjectUpdate(name=None)
+    with pytest.raises(ValidationError):
+        ScheduleUpdate(phase_name=None)
+    assert ScheduleUpdate(description=None).model_dump(exclude_unset=True) == {"description": None}
+
+
+@pytest.mark.parametrize("value", ["2026-13-01", "next monday", "05/01/2026"])
+def test_dates_must_be_iso(value):
+    with pytest.raises(ValidationError):
+        ProjectUpdate(start_date=value)
+    with pytest.raises(ValidationError):
+        ScheduleUpdate(start_date=value)
+
+
+def test_valid_dates_are_kept_as_strings():
+    assert ProjectUpdate(end_date="2026-03-31").end_date == "2026-03-31"
+    assert ScheduleUpdate(start_date="2026-01-05").start_date == "2026-01-05"
+
+
+def test_duration_must_be_positive():
+    with pytest.raises(ValidationError):
+        ScheduleUpdate(duration=0)
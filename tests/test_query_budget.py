@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from query_budget import QueryBudgetMiddleware, current_query_log, parse_route_budgets
+
+
+def querying_app(queries: int, repeated: bool = False):
+    async def app(scope, receive, send):
+        log = current_query_log.get()
+        for i in range(queries):
+            log.record("find users {}" if repeated else f"find users {i}")
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b'{"ok": true}'})
+    return app
+
+
+async def get(app, path: str = "/api/projects"):
+    scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start, body = sent
+    return start["status"], dict(start["headers"]), body["body"]
+
+
+@pytest.mark.anyio
+async def test_fail_mode_replaces_an_over_budget_response():
+    app = QueryBudgetMiddleware(querying_app(6, repeated=True), mode="fail", budget=5, repeat_threshold=5)
+
+    status, headers, body = await get(app)
+    report = json.loads(body)
+
+    assert status == 500
+    assert headers[b"x-query-count"] == b"6"
+    assert report["budget"] == 5 and report["queries"] == 6
+    assert report["route"] == "GET /api/projects"
+    assert report["repeated"] == [{"query": "find users {}", "count": 6}]
+
+
+@pytest.mark.anyio
+async def test_fail_mode_passes_requests_within_budget():
+    app = QueryBudgetMiddleware(querying_app(5), mode="fail", budget=5)
+
+    status, headers, body = await get(app)
+
+    assert status == 200
+    assert headers[b"x-query-count"] == b"5"
+    assert body == b'{"ok": true}'
+
+
+@pytest.mark.anyio
+async def test_warn_mode_keeps_the_response():
+    app = QueryBudgetMiddleware(querying_app(6), mode="warn", budget=5)
+
+    status, _, body = await get(app)
+
+    assert status == 200
+    assert body == b'{"ok": true}'
+
+
+@pytest.mark.anyio
+async def test_route_budgets_override_the_default():
+    app = QueryBudgetMiddleware(
+        querying_app(6), mode="fail", budget=5,
+        route_budgets=parse_route_budgets("GET /api/projects=10, POST /api/holidays=40"),
+    )
+
+    status, _, _ = await get(app)
+
+    assert status == 200
@@ -0,0 +1,61 @@
+import pytest
+
+import server
+
+
+def phase(schedule_id, start_date, duration, end_date):
+    return {
+        "schedule_id": schedule_id,
+        "project_id": "p1",
+        "start_date": start_date,
+        "duration": duration,
+        "end_date": end_date,
+        "version": 0,
+    }
+
+
+@pytest.fixture
+def schedules(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "db", fake_db)
+    # A -> B -> C chained by create_schedule; D belongs to the same project but not the chain.
+    fake_db.schedules.documents.extend([
+        phase("a", "2026-01-05", 3, "2026-01-08"),
+        phase("b", "2026-01-08", 2, "2026-01-10"),
+        phase("c", "2026-01-10", 2, "2026-01-13"),
+        phase("d", "2026-02-02", 5, "2026-02-07"),
+    ])
+    return {doc["schedule_id"]: doc for doc in fake_db.schedules.documents}
+
+
+@pytest.mark.anyio
+async def test_reflow_moves_the_chain(schedules):
+    moved = await server.reflow_phases("p1", "a", "2026-01-08", "2026-01-09", set())
+
+    assert moved == ["b", "c"]
+    assert (schedules["b"]["start_date"], schedules["b"]["end_date"]) == ("2026-01-09", "2026-01-12")
+    assert (schedules["c"]["start_date"], schedules["c"]["end_date"]) == ("2026-01-12", "2026-01-14")
+    assert schedules["d"]["end_date"] == "2026-02-07"
+    assert schedules["b"]["version"] == schedules["c"]["version"] == 1
+
+
+@pytest.mark.anyio
+async def test_reflow_skips_holidays(schedules):
+    await server.reflow_phases("p1", "a", "2026-01-08", "2026-01-09", {"2026-01-12"})
+
+    assert schedules["b"]["end_date"] == "2026-01-13"
+    assert (schedules["c"]["start_date"], schedules["c"]["end_date"]) == ("2026-01-13", "2026-01-15")
+
+
+@pytest.mark.anyio
+async def test_reflow_never_revisits_a_moved_phase(schedules):
+    # B moves onto 2026-01-10, C's start date; it must not be picked up again.
+    moved = await server.reflow_phases("p1", "a", "2026-01-08", "2026-01-10", set())
+
+    assert moved == ["b", "c"]
+    assert schedules["b"]["version"] == 1
+
+
+@pytest.mark.anyio
+async def test_reflow_stops_when_the_end_date_is_unchanged(schedules):
+    assert await server.reflow_phases("p1", "a", "2026-01-08", "2026-01-08", set()) == []
+    assert schedules["b"]["version"] == 0
@@ -0,0 +1,55 @@
+import pytest
+from fastapi import HTTPException
+
+from uploads import write_chunks
+
+# 10-byte file in 4-byte chunks: offsets 0, 4 and 8, the last chunk 2 bytes.
+SESSION = {"upload_id": "u1", "file_id": "f1", "size": 10, "chunk_size": 4, "status": "open"}
+
+
+@pytest.fixture
+def db(fake_db):
+    fake_db.upload_sessions.documents.append(dict(SESSION))
+    return fake_db
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("offset, body", [
+    (0, b"abcdefgh"),   # two whole chunks
+    (4, b"efgh"),       # one whole chunk
+    (8, b"ij"),         # short last chunk
+    (4, b"efghij"),     # whole chunk plus the short last one
+    (0, b"abcdefghij"), # the whole file
+])
+async def test_accepted_offsets(db, offset, body):
+    written = await write_chunks(db, SESSION, offset, body, 24)
+
+    assert written == -(-len(body) // 4)
+    assert len(db["fs.chunks"].bulk_writes[0]) == written
+    assert "expires_at" in db.upload_sessions.documents[0]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("offset, body", [
+    (2, b"cdef"),       # not on a chunk boundary
+    (-4, b"abcd"),      # negative
+    (12, b"ab"),        # past the end
+    (0, b"abc"),        # partial chunk before the end of the file
+    (4, b"efghi"),      # partial trailing chunk before the end
+    (8, b"ijk"),        # runs past the end of the file
+    (0, b""),           # empty body
+])
+async def test_rejected_offsets(db, offset, body):
+    with pytest.raises(HTTPException) as error:
+        await write_chunks(db, SESSION, offset, body, 24)
+
+    assert error.value.status_code == 400
+    assert db["fs.chunks"].bulk_writes == []
+
+
+@pytest.mark.anyio
+async def test_completed_session_rejects_chunks(db):
+    with pytest.raises(HTTPException) as error:
+        await write_chunks(db, {**SESSION, "status": "completing"}, 0, b"abcd", 24)
+
+    assert error.value.status_code == 409